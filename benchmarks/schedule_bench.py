@@ -0,0 +1,200 @@
+"""
+Бенчмарк составления расписания на синтетических данных.
+
+Запуск из корня репозитория:
+    python -m benchmarks.schedule_bench
+    python -m benchmarks.schedule_bench --sizes 10 100 --days 7 --output results.json
+
+Для каждого размера команды и горизонта замеряются этапы разбора ответов, генерации расписания,
+построения таблицы и отрисовки одной страницы изображения: лучшее время из нескольких повторов
+и пиковая память (tracemalloc). Результаты печатаются таблицей и сохраняются в JSON,
+чтобы сравнивать версии между собой. Telegram и Google Sheets не используются.
+"""
+import argparse
+import json
+import logging
+import math
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from src.core.availability import WEEKDAYS, parse_responses
+from src.core.scheduler import generate_schedule, build_schedule_table
+from src.utils.render_service import render_table
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+DEFAULT_DAYS = [7, 28, 56]
+DEFAULT_OUTPUT = Path(__file__).parent / "results" / "schedule_bench.json"
+
+# Сколько строк таблицы рисуется на одной странице изображения (как ROSTER_PAGE_SIZE в боте)
+PAGE_SIZE = 40
+
+
+def make_roster(employees: int, seed: int = 0, availability: float = 0.5, preference: float = 0.2) -> list:
+    """Синтетические ответы формы: каждый день недели отмечается с вероятностью availability"""
+    rng = random.Random(seed)
+    responses = []
+    for i in range(employees):
+        days = [day for day in WEEKDAYS if rng.random() < availability]
+        preferred = [day for day in days if rng.random() < preference]
+        responses.append({
+            "Отметка времени": f"01.01.2026 {i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}",
+            "ФИО": f"Сотрудник {i:05d}",
+            "Дни": ", ".join(days),
+            "Предпочтительные дни": ", ".join(preferred),
+        })
+    return responses
+
+
+def make_demand(employees: int, days: int, load: float = 0.2):
+    """
+    Слоты на горизонт из days дней, начиная с понедельника.
+    Для 7 дней ключи — названия дней недели, для длинных горизонтов — даты.
+    """
+    slots = max(1, math.ceil(employees * load))
+    if days == 7:
+        return {day: slots for day in WEEKDAYS}, None
+
+    start = date(2026, 1, 5)
+    keys = [(start + timedelta(days=i)).isoformat() for i in range(days)]
+    return {key: slots for key in keys}, {key: WEEKDAYS[i % 7] for i, key in enumerate(keys)}
+
+
+def measure(func, repeats: int) -> dict:
+    """Лучшее и среднее время из repeats запусков и пиковая память отдельного запуска"""
+    timings = []
+    result = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "best_s": min(timings),
+        "mean_s": sum(timings) / len(timings),
+        "peak_kib": peak / 1024,
+        "result": result,
+    }
+
+
+def run_case(employees: int, days: int, engines: list, renderers: list, repeats: int,
+             flow_limit: int) -> list:
+    responses = make_roster(employees)
+    shifts, day_names = make_demand(employees, days)
+    results = []
+
+    def record(stage: str, measurement: dict, **extra):
+        results.append({
+            "employees": employees,
+            "days": days,
+            "stage": stage,
+            **extra,
+            "best_s": round(measurement["best_s"], 6),
+            "mean_s": round(measurement["mean_s"], 6),
+            "peak_kib": round(measurement["peak_kib"], 1),
+        })
+
+    parsed = measure(lambda: parse_responses(responses), repeats)
+    record("parse", parsed)
+    records = parsed["result"]
+
+    schedule = None
+    for engine in engines:
+        if engine == "flow" and employees > flow_limit:
+            continue
+        generated = measure(
+            lambda: generate_schedule(records, shifts, engine=engine, day_names=day_names), repeats
+        )
+        record("generate", generated, engine=engine, unfilled=len(generated["result"][1]))
+        schedule = schedule or generated["result"][0]
+
+    names = [r.fio for r in records]
+    availability = {r.fio: r for r in records}
+    if day_names:
+        # Таблица строится по названиям дней, поэтому для дат берётся только первая неделя
+        schedule = {day_names[key]: schedule[key] for key in list(shifts)[:7]}
+
+    table = measure(lambda: build_schedule_table(schedule, names, availability, as_array=True), repeats)
+    record("table", table)
+    cells, rows, columns = table["result"]
+
+    for renderer in renderers:
+        try:
+            rendered = measure(
+                lambda: render_table(renderer, cells[:PAGE_SIZE], rows[:PAGE_SIZE], columns, 300), repeats
+            )
+        except Exception as e:
+            results.append({"employees": employees, "days": days, "stage": "render_page", "renderer": renderer,
+                            "error": str(e)})
+            continue
+        record("render_page", rendered, renderer=renderer, bytes=len(rendered["result"]),
+               pages=math.ceil(len(rows) / PAGE_SIZE))
+
+    return results
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк составления расписания")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Размеры команды")
+    parser.add_argument("--days", type=int, nargs="+", default=DEFAULT_DAYS, help="Длина горизонта в днях")
+    parser.add_argument("--engines", nargs="+", default=["greedy", "flow"], choices=["greedy", "flow"])
+    parser.add_argument("--renderers", nargs="+", default=["pillow"], choices=["pillow", "matplotlib"])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--flow-limit", type=int, default=1000,
+                        help="Алгоритм flow замеряется только для команд не больше этого размера")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT, help="Файл для результатов в JSON")
+    args = parser.parse_args(argv)
+
+    # Логи алгоритмов на каждый повтор только мешают читать результаты
+    logging.getLogger("src.core.scheduler").setLevel(logging.WARNING)
+
+    results = []
+    for employees in args.sizes:
+        for days in args.days:
+            for row in run_case(employees, days, args.engines, args.renderers, args.repeats, args.flow_limit):
+                results.append(row)
+                label = row.get("engine") or row.get("renderer") or ""
+                if "error" in row:
+                    print(f"{employees:>6} x {days:<3} {row['stage']:<12} {label:<11} ошибка: {row['error']}")
+                else:
+                    print(f"{employees:>6} x {days:<3} {row['stage']:<12} {label:<11} "
+                          f"{row['best_s'] * 1000:10.2f} мс {row['peak_kib']:12.1f} КиБ")
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment(), "results": results}, f, ensure_ascii=False, indent=2)
+    print(f"Результаты сохранены в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""
+Подмены Google Sheets и Telegram для нагрузочного тестирования.
+
+FakeWorksheet повторяет методы gspread.Worksheet, которые использует GoogleSheetsManager,
+FakeBot — методы бота, которые вызывают обработчики. Задержки, ошибки и ответы 429
+настраиваются через FaultConfig, счётчики вызовов собираются в stats.
+"""
+import asyncio
+import itertools
+import random
+import threading
+import time
+from collections import Counter, deque
+from types import SimpleNamespace
+from typing import Dict, List, NamedTuple, Optional
+
+from telegram.error import NetworkError, RetryAfter
+
+
+class FaultConfig(NamedTuple):
+    """Задержка ответа (равномерно от latency_min до latency_max секунд) и доли неудачных вызовов"""
+    latency_min: float = 0.0
+    latency_max: float = 0.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: int = 1
+    seed: Optional[int] = None
+
+
+class FaultInjector:
+    """Выбирает задержку и исход каждого вызова; потокобезопасен, так как gspread вызывается из пула потоков"""
+
+    def __init__(self, config: FaultConfig):
+        self.config = config
+        self.stats = Counter()
+        self._random = random.Random(config.seed)
+        self._lock = threading.Lock()
+
+    def draw(self, operation: str):
+        """Возвращает (задержка, исход), где исход — None, "error" или "rate_limit" """
+        config = self.config
+        with self._lock:
+            self.stats[operation] += 1
+            latency = self._random.uniform(config.latency_min, max(config.latency_min, config.latency_max))
+            roll = self._random.random()
+            if roll < config.rate_limit_rate:
+                outcome = "rate_limit"
+            elif roll < config.rate_limit_rate + config.error_rate:
+                outcome = "error"
+            else:
+                outcome = None
+            if outcome:
+                self.stats[outcome] += 1
+        return latency, outcome
+
+
+class FakeAPIError(Exception):
+    """Ошибка с HTTP-статусом в response.status_code, как у gspread.exceptions.APIError"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.response = SimpleNamespace(status_code=status_code)
+
+
+class FakeSpreadsheet:
+    def __init__(self, worksheet: "FakeWorksheet"):
+        self._worksheet = worksheet
+        self.title = "Ответы"
+
+    def get_lastUpdateTime(self) -> str:
+        self._worksheet._fault("get_lastUpdateTime")
+        return f"version-{self._worksheet.version}"
+
+    def worksheets(self) -> list:
+        return [self._worksheet]
+
+
+class FakeWorksheet:
+    """Лист с ответами формы в памяти; строки хранятся как списки строк, первая — заголовок"""
+
+    def __init__(self, rows: List[List[str]], faults: FaultConfig = None):
+        self.title = "Form_Responses1"
+        self.rows = [list(row) for row in rows]
+        self.version = 0
+        self.faults = FaultInjector(faults or FaultConfig())
+        self.spreadsheet = FakeSpreadsheet(self)
+        self._lock = threading.Lock()
+
+    def _fault(self, operation: str):
+        latency, outcome = self.faults.draw(operation)
+        if latency:
+            time.sleep(latency)  # gspread блокирует поток так же
+        if outcome == "rate_limit":
+            raise FakeAPIError(429, "Quota exceeded")
+        if outcome == "error":
+            raise FakeAPIError(503, "Service unavailable")
+
+    def append_row(self, row: List[str]):
+        """Новый ответ формы (без задержек и ошибок — его добавляет сама форма)"""
+        with self._lock:
+            self.rows.append(list(row))
+            self.version += 1
+
+    @staticmethod
+    def _column(letters: str) -> int:
+        number = 0
+        for letter in letters:
+            number = number * 26 + ord(letter.upper()) - ord("A") + 1
+        return number
+
+    def _parse_range(self, range_name: str):
+        """Диапазон вида "A5:D" или "A2:D10" в (первая строка, последняя строка, число столбцов)"""
+        start, _, end = range_name.partition(":")
+        first_row = int(start.lstrip("ABCDEFGHIJKLMNOPQRSTUVWXYZ") or 1)
+        end_letters = end.rstrip("0123456789")
+        end_digits = end[len(end_letters):]
+        last_row = int(end_digits) if end_digits else len(self.rows)
+        return first_row, last_row, self._column(end_letters)
+
+    def get(self, range_name: str) -> List[List[str]]:
+        self._fault("get")
+        first_row, last_row, width = self._parse_range(range_name)
+        with self._lock:
+            return [list(row[:width]) for row in self.rows[first_row - 1:last_row]]
+
+    def get_all_values(self) -> List[List[str]]:
+        self._fault("get_all_values")
+        with self._lock:
+            return [list(row) for row in self.rows]
+
+    def col_values(self, col: int) -> List[str]:
+        self._fault("col_values")
+        with self._lock:
+            values = [row[col - 1] if len(row) >= col else "" for row in self.rows]
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def batch_clear(self, ranges: List[str]):
+        self._fault("batch_clear")
+        with self._lock:
+            for range_name in ranges:
+                first_row, last_row, width = self._parse_range(range_name)
+                for row in self.rows[first_row - 1:last_row]:
+                    row[:width] = [""] * min(width, len(row))
+            self.version += 1
+
+    def update(self, range_name: str, values: List[List[str]], value_input_option: str = None):
+        self._fault("update")
+        first_row, _, _ = self._parse_range(range_name)
+        with self._lock:
+            for offset, row in enumerate(values):
+                index = first_row - 1 + offset
+                if index < len(self.rows):
+                    self.rows[index] = list(row)
+                else:
+                    self.rows.append(list(row))
+            self.version += 1
+
+
+class FakeBot:
+    """
+    Бот без сети: последние HISTORY_SIZE сообщений запоминаются по chat_id,
+    загруженные фотографии получают новый file_id, а отправленные по file_id — сохраняют его.
+    Ответ 429 выбрасывается как RetryAfter, прочие ошибки — как NetworkError.
+    """
+    HISTORY_SIZE = 10
+
+    def __init__(self, faults: FaultConfig = None):
+        self.faults = FaultInjector(faults or FaultConfig())
+        self.messages: Dict[int, deque] = {}
+        self.uploaded = 0
+        self._file_ids = itertools.count(1)
+
+    @property
+    def stats(self) -> Counter:
+        return self.faults.stats
+
+    async def _call(self, operation: str):
+        latency, outcome = self.faults.draw(operation)
+        if latency:
+            await asyncio.sleep(latency)
+        if outcome == "rate_limit":
+            raise RetryAfter(self.faults.config.retry_after)
+        if outcome == "error":
+            raise NetworkError("Fake network error")
+
+    def _photo(self, photo) -> SimpleNamespace:
+        if isinstance(photo, str):
+            file_id = photo
+        else:
+            self.uploaded += 1
+            file_id = f"fake-file-{next(self._file_ids)}"
+        return SimpleNamespace(photo=[SimpleNamespace(file_id=file_id)])
+
+    def _remember(self, chat_id, text: str, reply_markup=None) -> SimpleNamespace:
+        message = SimpleNamespace(chat_id=chat_id, text=text, reply_markup=reply_markup)
+        history = self.messages.get(chat_id)
+        if history is None:
+            history = self.messages[chat_id] = deque(maxlen=self.HISTORY_SIZE)
+        history.append(message)
+        return message
+
+    def buttons(self, chat_id, prefix: str = "") -> List[str]:
+        """callback_data кнопок последнего сообщения чата, у которого есть кнопки с этим префиксом"""
+        for message in reversed(self.messages.get(chat_id, ())):
+            keyboard = getattr(message.reply_markup, "inline_keyboard", None)
+            if not keyboard:
+                continue
+            data = [
+                button.callback_data
+                for row in keyboard for button in row
+                if button.callback_data and button.callback_data.startswith(prefix)
+            ]
+            if data:
+                return data
+        return []
+
+    async def send_message(self, chat_id, text: str, reply_markup=None, **kwargs):
+        await self._call("send_message")
+        return self._remember(chat_id, text, reply_markup)
+
+    async def edit_message_text(self, text: str, chat_id=None, reply_markup=None, **kwargs):
+        await self._call("edit_message_text")
+        return self._remember(chat_id, text, reply_markup)
+
+    async def answer_callback_query(self, callback_query_id=None, text: str = None, **kwargs):
+        await self._call("answer_callback_query")
+        return True
+
+    async def send_photo(self, chat_id, photo, caption: str = None, **kwargs):
+        await self._call("send_photo")
+        return self._photo(photo)
+
+    async def send_media_group(self, chat_id, media: list, **kwargs):
+        await self._call("send_media_group")
+        return [self._photo(item.media) for item in media]
+
+
+class FakeMessage:
+    """update.message: ответы уходят через FakeBot.send_message"""
+
+    def __init__(self, bot: FakeBot, chat_id: int, text: str = None):
+        self._bot = bot
+        self.chat_id = chat_id
+        self.text = text
+
+    async def reply_text(self, text: str, reply_markup=None, **kwargs):
+        return await self._bot.send_message(self.chat_id, text, reply_markup=reply_markup)
+
+
+class FakeCallbackQuery:
+    """update.callback_query: нажатие inline-кнопки с данными data"""
+
+    def __init__(self, bot: FakeBot, chat_id: int, data: str):
+        self._bot = bot
+        self.data = data
+        self.from_user = SimpleNamespace(id=chat_id)
+        self._chat_id = chat_id
+        self.replies = []
+
+    async def answer(self, text: str = None, **kwargs):
+        return await self._bot.answer_callback_query(text=text)
+
+    async def edit_message_text(self, text: str, reply_markup=None, **kwargs):
+        self.replies.append(text)
+        return await self._bot.edit_message_text(text, chat_id=self._chat_id, reply_markup=reply_markup)
+
+
+def make_update(bot: FakeBot, chat_id: int, text: str = None, callback_data: str = None) -> SimpleNamespace:
+    """Update с сообщением text или нажатием кнопки callback_data от пользователя chat_id"""
+    user = SimpleNamespace(id=chat_id, username=f"user{chat_id}", full_name=f"User {chat_id}")
+    return SimpleNamespace(
+        effective_chat=SimpleNamespace(id=chat_id),
+        effective_user=user,
+        message=FakeMessage(bot, chat_id, text) if callback_data is None else None,
+        callback_query=FakeCallbackQuery(bot, chat_id, callback_data) if callback_data is not None else None,
+    )
+
+
+def make_context(bot: FakeBot, bot_data: dict, user_data: dict = None, args: list = None) -> SimpleNamespace:
+    """CallbackContext с общими bot_data и user_data конкретного пользователя"""
+    return SimpleNamespace(bot=bot, bot_data=bot_data, user_data=user_data if user_data is not None else {},
+                           args=args or [])
@@ -0,0 +1,389 @@
+"""
+Нагрузочный тест обработчиков бота на подменах Telegram и Google Sheets.
+
+Запуск из корня репозитория:
+    python -m loadtest.run
+    python -m loadtest.run --users 5000 --requests 5000 --concurrency 500 --telegram-429 0.02
+
+Настоящие обработчики (рассылка auto_send_schedule, просмотр расписания show_schedule
+и обмен сменами от запроса до принятия) работают с FakeBot и FakeWorksheet
+во временном каталоге данных, так что реальные квоты и файлы data/ не затрагиваются.
+Для каждого сценария измеряются пропускная способность, задержки ответов
+и задержки цикла событий (как долго он был занят, не отвечая остальным чатам).
+"""
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from loadtest.fakes import FakeBot, FakeWorksheet, FaultConfig, make_context, make_update
+
+DEFAULT_OUTPUT = Path(__file__).parent / "results" / "loadtest.json"
+FORM_HEADERS = ["Отметка времени", "ФИО", "Дни", "Предпочтительные дни"]
+FIRST_CHAT_ID = 100000
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def latency_summary(values: list) -> dict:
+    """Задержки в миллисекундах"""
+    return {
+        "p50_ms": round(percentile(values, 0.5) * 1000, 2),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+        "max_ms": round(max(values, default=0.0) * 1000, 2),
+    }
+
+
+class LoopStallMonitor:
+    """
+    Проверяет, насколько позже запланированного просыпается короткий таймер.
+    Задержка больше threshold означает, что цикл событий был заблокирован и другие чаты ждали.
+    """
+
+    def __init__(self, interval: float = 0.01, threshold: float = 0.1):
+        self.interval = interval
+        self.threshold = threshold
+        self.lags = []
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - expected))
+
+    async def stop(self) -> dict:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        return {
+            **latency_summary(self.lags),
+            "stalls": sum(lag > self.threshold for lag in self.lags),
+            "stalled_s": round(sum(lag for lag in self.lags if lag > self.threshold), 3),
+        }
+
+
+class LoadTest:
+    """Окружение теста: временное хранилище, подменённые лист и бот, пользователи и слоты"""
+
+    def __init__(self, args, data_dir: Path):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.sheet = FakeWorksheet(self._form_rows(), FaultConfig(
+            latency_min=args.sheets_latency[0], latency_max=args.sheets_latency[1],
+            error_rate=args.sheets_errors, rate_limit_rate=args.sheets_429, seed=args.seed
+        ))
+        self.bot = FakeBot(FaultConfig(
+            latency_min=args.telegram_latency[0], latency_max=args.telegram_latency[1],
+            error_rate=args.telegram_errors, rate_limit_rate=args.telegram_429,
+            retry_after=args.retry_after, seed=args.seed
+        ))
+        self.chat_ids = [FIRST_CHAT_ID + i for i in range(args.users)]
+        self._configure(data_dir)
+
+    def _form_rows(self) -> list:
+        from benchmarks.schedule_bench import make_roster
+
+        roster = make_roster(self.args.users, seed=self.args.seed)
+        return [FORM_HEADERS] + [[record[column] for column in FORM_HEADERS] for record in roster]
+
+    def _configure(self, data_dir: Path):
+        from src.bot import broadcast
+        from src.bot.user_manager import UserManager
+        from src.bot.utils import gs_manager
+        from src.core import backends, google_utils
+        from src.core.storage import save_shifts
+        from src.utils.render_cache import render_cache
+
+        backends.DATA_DIR = data_dir
+        google_utils.RESPONSES_STORE_FILE = data_dir / "responses.json"
+        broadcast.STATE_FILE = data_dir / "broadcast_state.json"
+        render_cache.cache_dir = data_dir / "render_cache"
+        render_cache.clear()
+
+        gs_manager.invalidate_cache()
+        gs_manager._sheet = self.sheet
+
+        user_manager = UserManager()
+        for i, chat_id in enumerate(self.chat_ids):
+            user_manager.save_user(chat_id, f"user{chat_id}", f"User {chat_id}", f"Сотрудник {i:05d}", approved=True)
+        user_manager.flush()
+        self.bot_data = {"user_manager": user_manager}
+
+        slots = max(1, math.ceil(self.args.users * self.args.load))
+        save_shifts({day: slots for day in ("Понедельник", "Вторник", "Среда", "Четверг",
+                                            "Пятница", "Суббота", "Воскресенье")})
+
+    def counters(self) -> dict:
+        return {"telegram": Counter(self.bot.stats), "sheets": Counter(self.sheet.faults.stats)}
+
+    async def run_scenario(self, name: str, calls: list, concurrency: int) -> dict:
+        """Выполняет calls (фабрики корутин, возвращающих исход) не больше concurrency одновременно"""
+        latencies = []
+        outcomes = Counter()
+        slots = asyncio.Semaphore(concurrency)
+        before = self.counters()
+        monitor = LoopStallMonitor(threshold=self.args.stall_threshold)
+        monitor.start()
+
+        async def run_one(call):
+            async with slots:
+                started = time.perf_counter()
+                try:
+                    outcome = await call() or "ok"
+                except Exception as e:
+                    outcome = f"exception:{type(e).__name__}"
+                latencies.append(time.perf_counter() - started)
+                outcomes[outcome] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(run_one(call) for call in calls))
+        elapsed = time.perf_counter() - started
+        loop_stats = await monitor.stop()
+        after = self.counters()
+
+        result = {
+            "scenario": name,
+            "requests": len(calls),
+            "concurrency": concurrency,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(len(calls) / elapsed, 2) if elapsed else None,
+            "latency": latency_summary(latencies),
+            "outcomes": dict(outcomes),
+            "event_loop": loop_stats,
+            "telegram_calls": dict(after["telegram"] - before["telegram"]),
+            "sheets_calls": dict(after["sheets"] - before["sheets"]),
+        }
+        return result
+
+    def _reply_outcome(self, chat_id, previous) -> str:
+        """Исход по последнему сообщению в чат: ответ с ⚠️ считается ошибкой"""
+        history = self.bot.messages.get(chat_id)
+        message = history[-1] if history else None
+        if message is not None and message is not previous and message.text.startswith("⚠️"):
+            return "error_reply"
+        return "ok"
+
+    async def broadcast(self) -> dict:
+        from src.bot.utils import auto_send_schedule
+
+        delivery = {}
+
+        async def call():
+            # Исход определяется итогом рассылки: сгенерированное, но не доставленное расписание — ошибка
+            summary = await auto_send_schedule(make_context(self.bot, self.bot_data))
+            if summary is None:
+                return "error"
+            delivery.update(summary)
+            if summary["sent"] == len(self.chat_ids):
+                return "ok"
+            return "partial" if summary["sent"] else "not_delivered"
+
+        result = await self.run_scenario("auto_send_schedule", [call], 1)
+        result["recipients"] = len(self.chat_ids)
+        result["delivery"] = delivery
+        result["uploads"] = self.bot.uploaded
+        return result
+
+    async def show_schedule(self) -> dict:
+        from src.bot.handlers import show_schedule
+
+        def make_call(chat_id):
+            async def call():
+                history = self.bot.messages.get(chat_id)
+                previous = history[-1] if history else None
+                await show_schedule(make_update(self.bot, chat_id, text="📅 Посмотреть расписание"),
+                                    make_context(self.bot, self.bot_data))
+                return self._reply_outcome(chat_id, previous)
+            return call
+
+        calls = [make_call(self.rng.choice(self.chat_ids)) for _ in range(self.args.requests)]
+        return await self.run_scenario("show_schedule", calls, self.args.concurrency)
+
+    async def _exchange(self, chat_id) -> str:
+        """Один обмен: выбор своего дня, коллеги и его дня, затем коллега принимает предложение"""
+        from src.bot.handlers import start_shift_exchange, handle_exchange_day_selection, \
+            handle_exchange_user_selection, handle_exchange_target_day_selection, handle_exchange_response
+
+        bot, rng = self.bot, self.rng
+        context = make_context(bot, self.bot_data)
+
+        await start_shift_exchange(make_update(bot, chat_id, text="🔄 Запросить обмен сменами"), context)
+        days = bot.buttons(chat_id, "exchange_day_")
+        if not days:
+            return "no_shifts"
+
+        await handle_exchange_day_selection(make_update(bot, chat_id, callback_data=rng.choice(days)), context)
+        colleagues = bot.buttons(chat_id, "exchange_user_")
+        if not colleagues:
+            return "no_colleagues"
+
+        await handle_exchange_user_selection(make_update(bot, chat_id, callback_data=rng.choice(colleagues)), context)
+        target_days = bot.buttons(chat_id, "exchange_target_day_")
+        if not target_days:
+            return "no_target_days"
+
+        target_id = context.user_data["exchange_target_user_id"]
+        await handle_exchange_target_day_selection(
+            make_update(bot, chat_id, callback_data=rng.choice(target_days)), context
+        )
+        offers = bot.buttons(target_id, f"accept_exchange_{chat_id}_")
+        if not offers:
+            return "offer_not_delivered"
+
+        # Ответ берётся из самого нажатия: в чат коллеги параллельно пишут его собственные обмены
+        response = make_update(bot, target_id, callback_data=offers[0])
+        await handle_exchange_response(response, make_context(bot, self.bot_data))
+        if not response.callback_query.replies:
+            return "no_reply"
+        reply = response.callback_query.replies[-1]
+        if reply.startswith("✅"):
+            return "accepted"
+        return "stale" if "больше не доступна" in reply or "устарело" in reply else "error_reply"
+
+    async def exchange(self) -> dict:
+        from src.core.storage import load_schedule
+
+        staffing = {day: len(staff) for day, staff in load_schedule().items()}
+        calls = [functools.partial(self._exchange, self.rng.choice(self.chat_ids))
+                 for _ in range(self.args.exchanges)]
+        result = await self.run_scenario("exchange", calls, self.args.concurrency)
+
+        # Обмены не должны менять число сотрудников в дне и ставить одного сотрудника в день дважды
+        schedule = load_schedule()
+        result["staffing_changed"] = [day for day, staff in schedule.items() if len(staff) != staffing.get(day)]
+        result["duplicate_assignments"] = sum(len(staff) - len(set(staff)) for staff in schedule.values())
+        return result
+
+
+async def run(args, data_dir: Path) -> list:
+    test = LoadTest(args, data_dir)
+
+    from src.utils.render_service import render_service
+    render_service.start()
+    try:
+        results = []
+        for scenario in args.scenarios:
+            result = await getattr(test, scenario)()
+            results.append(result)
+            print_result(result)
+        return results
+    finally:
+        render_service.shutdown()
+
+
+def print_result(result: dict):
+    latency, loop_stats = result["latency"], result["event_loop"]
+    print(f"{result['scenario']}: {result['requests']} запросов за {result['elapsed_s']} с "
+          f"({result['throughput_rps']} в секунду)")
+    print(f"  задержка: p50 {latency['p50_ms']} мс, p95 {latency['p95_ms']} мс, "
+          f"p99 {latency['p99_ms']} мс, max {latency['max_ms']} мс")
+    print(f"  цикл событий: p99 {loop_stats['p99_ms']} мс, max {loop_stats['max_ms']} мс, "
+          f"блокировок {loop_stats['stalls']} ({loop_stats['stalled_s']} с)")
+    print(f"  исходы: {result['outcomes']}")
+    print(f"  Telegram: {result['telegram_calls']}")
+    print(f"  Google Sheets: {result['sheets_calls']}")
+    if "delivery" in result:
+        print(f"  доставка: {result['delivery'] or 'нет'} из {result['recipients']} получателей")
+    if "duplicate_assignments" in result:
+        print(f"  дни с изменившимся числом сотрудников: {result['staffing_changed'] or 'нет'}, "
+              f"повторных назначений в день: {result['duplicate_assignments']}")
+
+
+def failures(results: list) -> list:
+    """Нарушения, при которых тест завершается с ненулевым кодом"""
+    problems = []
+    for result in results:
+        if "delivery" in result and result["outcomes"].get("ok") != result["requests"]:
+            problems.append(f"{result['scenario']}: расписание доставлено не всем ({result['outcomes']})")
+        if result.get("staffing_changed"):
+            problems.append(f"{result['scenario']}: изменилось число сотрудников в днях {result['staffing_changed']}")
+        if result.get("duplicate_assignments"):
+            problems.append(f"{result['scenario']}: повторных назначений в день {result['duplicate_assignments']}")
+    return problems
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота на подменах Telegram и Google Sheets")
+    parser.add_argument("--users", type=int, default=2000, help="Число одобренных пользователей и ответов формы")
+    parser.add_argument("--requests", type=int, default=2000, help="Число запросов show_schedule")
+    parser.add_argument("--exchanges", type=int, default=500, help="Число обменов сменами")
+    parser.add_argument("--concurrency", type=int, default=200, help="Сколько пользователей действуют одновременно")
+    parser.add_argument("--scenarios", nargs="+", default=["broadcast", "show_schedule", "exchange"],
+                        choices=["broadcast", "show_schedule", "exchange"])
+    parser.add_argument("--load", type=float, default=0.2, help="Доля сотрудников, нужная в каждый день")
+    parser.add_argument("--storage", default="json", choices=["json", "sqlite"])
+    # matplotlib ищет шрифты по путям Windows, поэтому по умолчанию используется переносимый pillow
+    parser.add_argument("--renderer", default=os.getenv("SCHEDULE_RENDERER", "pillow"),
+                        choices=["matplotlib", "pillow"])
+    parser.add_argument("--render-workers", type=int, default=None,
+                        help="Число процессов отрисовки (по умолчанию как RENDER_WORKERS)")
+    parser.add_argument("--broadcast-rate", type=float, default=30,
+                        help="Сообщений в секунду при рассылке (лимит Telegram — 30)")
+    parser.add_argument("--telegram-latency", type=float, nargs=2, default=[0.05, 0.2], metavar=("MIN", "MAX"))
+    parser.add_argument("--telegram-errors", type=float, default=0.0, help="Доля сетевых ошибок Telegram")
+    parser.add_argument("--telegram-429", type=float, default=0.0, help="Доля ответов 429 от Telegram")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after в ответах 429 от Telegram")
+    parser.add_argument("--sheets-latency", type=float, nargs=2, default=[0.2, 0.6], metavar=("MIN", "MAX"))
+    parser.add_argument("--sheets-errors", type=float, default=0.0, help="Доля ответов 503 от Google Sheets")
+    parser.add_argument("--sheets-429", type=float, default=0.0, help="Доля ответов 429 от Google Sheets")
+    parser.add_argument("--stall-threshold", type=float, default=0.1,
+                        help="С какой задержки (с) цикл событий считается заблокированным")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", type=Path, default=None,
+                        help="Каталог данных теста (по умолчанию временный, удаляется после запуска)")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT, help="Файл для результатов в JSON")
+    parser.add_argument("--verbose", action="store_true", help="Показывать логи бота")
+    args = parser.parse_args(argv)
+
+    # Без --verbose логи бота о каждом запросе не выводятся
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL)
+
+    # Модули бота и benchmarks читают эти настройки из окружения при импорте, поэтому они импортируются позже
+    os.environ["STORAGE_BACKEND"] = args.storage
+    os.environ["BROADCAST_RATE"] = str(args.broadcast_rate)
+    os.environ["SCHEDULE_RENDERER"] = args.renderer
+    if args.render_workers is not None:
+        os.environ["RENDER_WORKERS"] = str(args.render_workers)
+    from benchmarks.schedule_bench import environment
+
+    with tempfile.TemporaryDirectory(prefix="shiftschedule-loadtest-") as tmp_dir:
+        data_dir = args.data_dir or Path(tmp_dir)
+        results = asyncio.run(run(args, data_dir))
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    settings = {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment(), "settings": settings, "results": results},
+                  f, ensure_ascii=False, indent=2)
+    print(f"Результаты сохранены в {args.output}")
+
+    problems = failures(results)
+    for problem in problems:
+        print(f"ОШИБКА: {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
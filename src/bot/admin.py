@@ -1,20 +1,24 @@
-from datetime import time
+import asyncio
+from datetime import datetime, time
 
-import pandas as pd
 import pytz
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 from src.bot.utils import auto_send_schedule
 from src.bot.user_manager import UserManager
-from src.core.google_utils import GoogleSheetsManager
-from src.core.scheduler import generate_schedule
+from src.core.google_utils import GoogleSheetsManager, AsyncSheetsManager
+from src.core.horizon import HORIZON_WEEKS, publish_upcoming_week, set_date_slots
 from src.core.storage import load_admins, load_shifts, save_notification_time, load_notification_time, \
-    reset_shifts, save_shifts, save_schedule
+    reset_shifts, save_shifts
 import logging
 
 logger = logging.getLogger(__name__)
 gs_manager = GoogleSheetsManager()
+sheets = AsyncSheetsManager(gs_manager)
+
+# Сколько удалённых ответов перечисляется в отчёте об удалении повторов
+DEDUP_REPORT_LIMIT = 50
 
 # Обработчик команды /admin
 async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -27,10 +31,13 @@ async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     keyboard = [
         [InlineKeyboardButton("🔄 Пересчитать расписание", callback_data="generate_schedule")],
+        [InlineKeyboardButton(f"🗓 Расписание на {HORIZON_WEEKS} нед.", callback_data="generate_horizon")],
         [InlineKeyboardButton("⏰ Изменить время уведомления", callback_data="change_time")],
         [InlineKeyboardButton("📅 Изменить день уведомления", callback_data="change_day")],
         [InlineKeyboardButton("➕ Добавить слоты на день", callback_data="add_slots")],
+        [InlineKeyboardButton("📆 Слоты на дату", callback_data="date_slots")],
         [InlineKeyboardButton("🧹 Очистить таблицу ответов", callback_data="clear_sheet")],
+        [InlineKeyboardButton("🧽 Удалить повторные ответы", callback_data="deduplicate_sheet")],
         [InlineKeyboardButton("👥 Управление пользователями", callback_data="management")],
         [InlineKeyboardButton("♻️ Сбросить все слоты", callback_data="reset_shifts")]
     ]
@@ -47,27 +54,37 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if query.data == "generate_schedule":
         try:
             # Получаем данные из Google Sheets
-            data = gs_manager.get_clean_data()
-            if not data:
+            records = await sheets.get_latest_availability()
+            if not records:
                 raise ValueError("Нет данных для формирования графика")
 
-            # УДАЛЯЕМ ДУБЛИКАТЫ (добавляем эту строку)
-            if not gs_manager.remove_duplicates():
-                raise ValueError("Не удалось очистить дубликаты")
+            # Пересчитываются только изменившиеся даты, обмены на остальных днях сохраняются.
+            # Генерация занимает процессор, поэтому выполняется в пуле потоков
+            await asyncio.get_running_loop().run_in_executor(None, publish_upcoming_week, records)
 
-            # Обновляем данные после удаления дубликатов (на всякий случай)
-            data = gs_manager.get_clean_data()
+            await query.edit_message_text("✅ Расписание успешно пересчитано и сохранено!")
+        except Exception as e:
+            logger.error(f"Ошибка генерации расписания: {e}")
+            await query.edit_message_text(f"⚠️ Ошибка при формировании расписания: {e}")
 
-            df = pd.DataFrame(data)
-            shifts = load_shifts()
-            schedule_data, unfilled = generate_schedule(df, shifts)
+    elif query.data == "generate_horizon":
+        try:
+            records = await sheets.get_latest_availability()
+            if not records:
+                raise ValueError("Нет данных для формирования графика")
 
-            # Сохраняем расписание
-            save_schedule(schedule_data)
+            result, _, _ = await asyncio.get_running_loop().run_in_executor(None, publish_upcoming_week, records)
 
-            await query.edit_message_text("✅ Расписание успешно пересчитано и сохранено!")
+            message = f"✅ Расписание на {HORIZON_WEEKS} нед. обновлено, пересчитано дат: {len(result['changed'])}"
+            if result["changed"]:
+                message += "\n" + ", ".join(result["changed"])
+            if result["unfilled"]:
+                message += "\n\n⚠ Не заполнены смены:\n" + "\n".join(
+                    f"- {day}: {count}" for day, count in result["unfilled"]
+                )
+            await query.edit_message_text(message)
         except Exception as e:
-            logger.error(f"Ошибка генерации расписания: {e}")
+            logger.error(f"Ошибка генерации расписания на несколько недель: {e}")
             await query.edit_message_text(f"⚠️ Ошибка при формировании расписания: {e}")
 
     elif query.data == "change_time":
@@ -84,6 +101,12 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text("Выберите день для изменения количества слотов:", reply_markup=reply_markup)
 
+    elif query.data == "date_slots":
+        await query.edit_message_text("Введите дату и количество слотов в формате ДД.ММ.ГГГГ N "
+                                      "(например, 31.12.2026 2).\n"
+                                      "Для этой даты значение заменит число слотов по дню недели.")
+        context.user_data['awaiting_date_slots'] = True
+
     elif query.data.startswith("admin_day_"):  # Обработка выбора дня админом
         day_idx = int(query.data.split("_")[2])
         day_name = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"][day_idx]
@@ -93,7 +116,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     elif query.data == "clear_sheet":
         try:
-            if gs_manager.clear_responses():  # Используем новый метод
+            if await sheets.clear_responses():  # Используем новый метод
                 await query.edit_message_text("✅ Google-таблица очищена")
             else:
                 await query.edit_message_text("⚠️ Ошибка при очистке таблицы")
@@ -101,6 +124,26 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             logger.error(f"Ошибка очистки таблицы: {e}")
             await query.edit_message_text("⚠️ Ошибка при очистке таблицы")
 
+    elif query.data == "deduplicate_sheet":
+        try:
+            report = await sheets.deduplicate()
+            if report is None:
+                await query.edit_message_text("⚠️ Ошибка при удалении повторных ответов")
+                return
+
+            removed = report["removed"]
+            message = f"✅ Оставлено ответов: {report['kept']}, удалено повторных: {len(removed)}"
+            if removed:
+                # Сообщение Telegram ограничено 4096 символами, поэтому длинный список сокращается
+                shown = removed[:DEDUP_REPORT_LIMIT]
+                message += "\n\n" + "\n".join(f"- {r['ФИО']} ({r['Отметка времени']})" for r in shown)
+                if len(removed) > len(shown):
+                    message += f"\n… и ещё {len(removed) - len(shown)}"
+            await query.edit_message_text(message)
+        except Exception as e:
+            logger.error(f"Ошибка удаления повторных ответов: {e}")
+            await query.edit_message_text("⚠️ Ошибка при удалении повторных ответов")
+
     elif query.data == "management":  # Новая функция для обработки нажатия кнопки "Управление"
         try:
             user_manager = UserManager()
@@ -204,6 +247,22 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             context.user_data.pop('awaiting_slots', None)
             context.user_data.pop('selected_day', None)
 
+    if context.user_data.get('awaiting_date_slots'):
+        try:
+            date_str, slots_str = update.message.text.split()
+            day = datetime.strptime(date_str, "%d.%m.%Y").date()
+            slots = int(slots_str)
+            if slots >= 0:
+                set_date_slots(day, slots)
+                await update.message.reply_text(f"✅ Количество слотов на {date_str} изменено на {slots}. "
+                                                f"Пересчитайте расписание, чтобы применить изменение")
+            else:
+                await update.message.reply_text("⚠️ Количество слотов не может быть отрицательным")
+        except ValueError:
+            await update.message.reply_text("⚠️ Неверный формат. Используйте ДД.ММ.ГГГГ N")
+        finally:
+            context.user_data.pop('awaiting_date_slots', None)
+
 # Обработчик команды /accept
 async def accept_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -256,9 +315,7 @@ async def clear_sheet_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
 
     try:
-        # Создаём новый экземпляр менеджера для гарантии актуального подключения
-        manager = GoogleSheetsManager()
-        if manager.clear_responses():
+        if await sheets.clear_responses():
             await update.message.reply_text("✅ Таблица успешно очищена!")
         else:
             await update.message.reply_text("⚠️ Не удалось очистить таблицу. Проверьте логи.")
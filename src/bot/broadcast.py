@@ -0,0 +1,232 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from functools import partial
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = Path(__file__).parent.parent.parent / "data" / "broadcast_state.json"
+
+# Лимиты Telegram: ~30 сообщений в секунду на бота и ~1 сообщение в секунду в один чат
+GLOBAL_RATE = float(os.getenv("BROADCAST_RATE", "30"))
+PER_CHAT_RATE = 1
+CONCURRENCY = 20
+MAX_ATTEMPTS = 5
+# Рассылка, прерванная падением бота, досылается после перезапуска, если начата не раньше этого срока (секунды)
+RESUME_WINDOW = float(os.getenv("BROADCAST_RESUME_WINDOW", "86400"))
+
+STATUS_PENDING = "pending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+
+
+def _retry_after_seconds(error: RetryAfter) -> float:
+    """Достаёт задержку из RetryAfter (int или timedelta в зависимости от версии PTB)"""
+    retry_after = error.retry_after
+    if hasattr(retry_after, "total_seconds"):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class TokenBucket:
+    """Асинхронный token bucket: rate токенов в секунду, не больше capacity в запасе"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Останавливает выдачу токенов (например, после RetryAfter)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class BroadcastState:
+    """
+    Статусы доставки по получателям, сохраняемые на диск для возобновления рассылки.
+    payload — данные, по которым рассылку можно дослать после перезапуска (что именно отправлялось).
+    """
+
+    def __init__(self, broadcast_id: str, path: Path = None, flush_every: int = 25, payload: dict = None):
+        self.broadcast_id = broadcast_id
+        self.path = path or STATE_FILE
+        self.flush_every = flush_every
+        self.statuses: Dict[str, str] = {}
+        self.payload = payload if payload is not None else {}
+        self._unsaved = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+
+        if data.get("broadcast_id") == self.broadcast_id:
+            self.statuses = data.get("statuses", {})
+            # Сохранённые данные (например, file_id загруженных страниц) дополняют переданные
+            for key, value in data.get("payload", {}).items():
+                self.payload.setdefault(key, value)
+            logger.info(f"Возобновляем рассылку {self.broadcast_id}: "
+                        f"уже доставлено {sum(s == STATUS_SENT for s in self.statuses.values())}")
+
+    def is_sent(self, chat_id) -> bool:
+        return self.statuses.get(str(chat_id)) == STATUS_SENT
+
+    def mark(self, chat_id, status: str):
+        self.statuses[str(chat_id)] = status
+        self._unsaved += 1
+        if self._unsaved >= self.flush_every:
+            self.save()
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"broadcast_id": self.broadcast_id, "statuses": self.statuses, "payload": self.payload},
+                      f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._unsaved = 0
+
+
+def load_pending_broadcast(path: Path = None) -> Optional[Tuple[str, dict, List[int]]]:
+    """
+    Незавершённая рассылка из файла состояния: (broadcast_id, payload, получатели в статусе pending).
+    Возвращает None, если досылать нечего или рассылка начата раньше RESUME_WINDOW.
+    """
+    try:
+        with open(path or STATE_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    payload = data.get("payload") or {}
+    pending = [int(chat_id) for chat_id, status in data.get("statuses", {}).items() if status == STATUS_PENDING]
+    if not pending or not payload:
+        return None
+    if time.time() - payload.get("created_at", 0) > RESUME_WINDOW:
+        logger.warning(f"Рассылка {data.get('broadcast_id')} устарела, {len(pending)} получателей пропущено")
+        return None
+    return data["broadcast_id"], payload, pending
+
+
+class Broadcaster:
+    """
+    Рассылка с ограниченным числом параллельных отправок.
+    Соблюдает глобальный и початовый лимиты Telegram и повторяет отправку после RetryAfter.
+    send(chat_id, throttle) вызывает await throttle() перед каждым запросом к Telegram:
+    отправка из нескольких альбомов расходует по токену на каждый запрос.
+    """
+
+    def __init__(self, concurrency: int = CONCURRENCY, global_rate: float = GLOBAL_RATE,
+                 per_chat_rate: float = PER_CHAT_RATE, max_attempts: int = MAX_ATTEMPTS):
+        self.concurrency = concurrency
+        self.global_bucket = TokenBucket(global_rate)
+        self.per_chat_rate = per_chat_rate
+        self.max_attempts = max_attempts
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, 1)
+        return bucket
+
+    async def _throttle(self, chat_id):
+        """Ждёт токены початового и глобального лимита для одного запроса к Telegram"""
+        await self._chat_bucket(chat_id).acquire()
+        await self.global_bucket.acquire()
+
+    async def _deliver(self, chat_id, send: Callable[[int, Callable[[], Awaitable]], Awaitable]) -> str:
+        throttle = partial(self._throttle, chat_id)
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await send(chat_id, throttle)
+                return STATUS_SENT
+            except RetryAfter as e:
+                delay = _retry_after_seconds(e)
+                logger.warning(f"Лимит Telegram при отправке {chat_id}, ждём {delay} с")
+                self.global_bucket.pause(delay)
+                await asyncio.sleep(delay)
+            except (Forbidden, BadRequest) as e:
+                logger.error(f"Ошибка отправки {chat_id}: {e}")
+                return STATUS_FAILED
+            except NetworkError as e:
+                logger.warning(f"Сетевая ошибка при отправке {chat_id} (попытка {attempt}): {e}")
+                await asyncio.sleep(min(2 ** attempt, 30))
+            except Exception as e:
+                logger.error(f"Ошибка отправки {chat_id}: {e}")
+                return STATUS_FAILED
+
+        logger.error(f"Не удалось отправить {chat_id} за {self.max_attempts} попыток")
+        return STATUS_FAILED
+
+    async def run(self, broadcast_id: str, chat_ids: Iterable[int],
+                  send: Callable[[int, Callable[[], Awaitable]], Awaitable],
+                  payload: dict = None) -> Dict[str, int]:
+        """
+        Отправляет сообщение всем получателям через send(chat_id, throttle).
+        Получатели, которым рассылка с тем же broadcast_id уже доставлена, пропускаются.
+        payload сохраняется вместе со статусами (изменения попадают на диск при следующем сохранении)
+        и возвращается load_pending_broadcast, если рассылку прервал перезапуск.
+        """
+        state = BroadcastState(broadcast_id, payload=payload)
+        queue = asyncio.Queue()
+        skipped = 0
+        for chat_id in chat_ids:
+            if state.is_sent(chat_id):
+                skipped += 1
+                continue
+            state.statuses[str(chat_id)] = STATUS_PENDING
+            queue.put_nowait(chat_id)
+        state.save()
+
+        async def worker():
+            while True:
+                try:
+                    chat_id = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                state.mark(chat_id, await self._deliver(chat_id, send))
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.concurrency, queue.qsize()))]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            state.save()
+
+        result = {
+            "sent": sum(s == STATUS_SENT for s in state.statuses.values()),
+            "failed": sum(s == STATUS_FAILED for s in state.statuses.values()),
+            "skipped": skipped,
+        }
+        logger.info(f"Рассылка {broadcast_id} завершена: {result}")
+        return result
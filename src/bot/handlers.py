@@ -3,19 +3,18 @@ from telegram.ext import (
     ContextTypes
 )
 import logging
-from src.bot.utils import send_saved_schedule
-from src.core.google_utils import GoogleSheetsManager
-from src.core.storage import load_shifts, save_shifts, load_schedule, remove_exchange_offer, save_exchange_offer, \
-    find_exchange_offer, save_schedule
+from src.bot.utils import send_saved_schedule, my_shifts_text
+from src.core.storage import load_schedule, remove_exchange_offer, save_exchange_offer, \
+    find_exchange_offer, update_shifts, update_schedule
 
 logger = logging.getLogger(__name__)
-gs_manager = GoogleSheetsManager()
 
 HELP_TEXT = """
  🤖 Добро пожаловать! Вот что я умею:\n
     /start — Показать меню\n
     /help — Помощь по командам\n
     /set_fio <ФИО> — Установить ваше ФИО\n
+    /my_shifts — Показать только ваши смены\n
 """
 
 # Обработчик команды /help
@@ -51,6 +50,34 @@ async def show_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Ошибка при отправке расписания: {e}")
         await update.message.reply_text("⚠️ Ошибка при загрузке расписания")
 
+async def show_my_shifts(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Показывает только смены пользователя текстом, без отрисовки всей таблицы
+    """
+    try:
+        user_manager = context.bot_data['user_manager']
+        chat_id = update.effective_chat.id
+
+        if not user_manager.is_approved(chat_id):
+            await update.message.reply_text("⛔ Вы не одобрены для использования этой команды")
+            return
+
+        user_info = user_manager.get_user_info(chat_id)
+        if not user_info or not user_info.get('fio'):
+            await update.message.reply_text("⚠️ Сначала укажите ФИО: /set_fio Иванов Иван Иванович")
+            return
+
+        text = my_shifts_text(user_info['fio'])
+        if text is None:
+            await update.message.reply_text("ℹ️ Расписание ещё не сгенерировано. Обратитесь к администратору.")
+            return
+
+        await update.message.reply_text(text)
+
+    except Exception as e:
+        logger.error(f"Ошибка при отправке смен пользователя: {e}")
+        await update.message.reply_text("⚠️ Ошибка при загрузке расписания")
+
 async def add_slots(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик добавления слотов с проверкой прав доступа"""
     try:
@@ -72,7 +99,6 @@ async def add_slots(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     return
 
                 day_idx = int(parts[2])  # Получаем индекс дня из третьей части
-                shifts = load_shifts()
                 days = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
 
                 if day_idx < 0 or day_idx >= len(days):
@@ -80,9 +106,8 @@ async def add_slots(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     return
 
                 day = days[day_idx]
-                shifts[day] += 1
-                save_shifts(shifts)
-                await query.edit_message_text(f"✅ Добавлен слот для {day}. Теперь: {shifts[day]}")
+                slots = update_shifts(day, 1)
+                await query.edit_message_text(f"✅ Добавлен слот для {day}. Теперь: {slots}")
 
             except Exception as e:
                 logger.error(f"Ошибка в add_slots: {e}")
@@ -392,29 +417,28 @@ async def handle_exchange_response(update: Update, context: ContextTypes.DEFAULT
                 await query.edit_message_text("⚠️ Информация о пользователях не найдена")
                 return
 
-            # Проверяем, что смены все еще актуальны
-            schedule = load_schedule()
-
-            if (from_user['fio'] not in schedule.get(day_to_give, []) or
-                    to_user['fio'] not in schedule.get(day_to_get, [])):
-                await query.edit_message_text("⚠️ Одна из смен больше не доступна для обмена")
-                remove_exchange_offer(offer)
-                return
+            def swap_shifts(schedule):
+                # Проверяем, что смены все еще актуальны и после обмена никто не окажется в дне дважды:
+                # проверка при создании предложения могла устареть из-за других обменов
+                if (from_user['fio'] not in schedule.get(day_to_give, []) or
+                        to_user['fio'] not in schedule.get(day_to_get, []) or
+                        to_user['fio'] in schedule.get(day_to_give, []) or
+                        from_user['fio'] in schedule.get(day_to_get, [])):
+                    return False
 
-            # Выполняем обмен
-            try:
+                # Выполняем обмен
                 schedule[day_to_give].remove(from_user['fio'])
                 schedule[day_to_give].append(to_user['fio'])
 
                 schedule[day_to_get].remove(to_user['fio'])
                 schedule[day_to_get].append(from_user['fio'])
-            except ValueError as e:
-                logger.error(f"Ошибка при обмене сменами: {e}")
-                await query.edit_message_text("⚠️ Ошибка при обмене сменами")
-                return
+                return True
 
-            # Сохраняем новое расписание
-            save_schedule(schedule)
+            # Проверка и обмен выполняются в одной транзакции, новое расписание сохраняется
+            if not update_schedule(swap_shifts):
+                await query.edit_message_text("⚠️ Одна из смен больше не доступна для обмена")
+                remove_exchange_offer(offer)
+                return
 
             # Удаляем предложение
             remove_exchange_offer(offer)
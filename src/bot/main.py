@@ -1,5 +1,8 @@
 import os
 import logging
+import subprocess
+import sys
+from pathlib import Path
 from dotenv import load_dotenv
 import pytz
 from datetime import time
@@ -7,12 +10,14 @@ from datetime import time
 from telegram import Update
 from telegram.ext import ApplicationBuilder, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
 from src.bot.handlers import set_fio, add_slots, handle_exchange_day_selection, handle_exchange_user_selection, \
-    handle_exchange_target_day_selection, handle_exchange_response
+    handle_exchange_target_day_selection, handle_exchange_response, show_my_shifts
 from src.bot.admin import admin_panel, clear_sheet_command, accept_command, deny_command, button_handler, handle_message
 from src.bot.user_manager import UserManager
 from src.bot.user_menu import handle_user_menu_selection, start
-from src.bot.utils import auto_send_schedule
+from src.bot.utils import auto_send_schedule, compact_exchange_offers_job, resync_responses_job, \
+    resume_broadcast_job, RESPONSES_RESYNC_INTERVAL
 from src.core.storage import load_notification_time
+from src.utils.render_service import render_service
 
 load_dotenv()
 TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
@@ -28,12 +33,46 @@ async def combined_message_handler(update: Update, context: ContextTypes.DEFAULT
     # Сначала проверяем админские запросы
     if (context.user_data.get('awaiting_time') or
             context.user_data.get('awaiting_day') or
-            context.user_data.get('awaiting_slots')):
+            context.user_data.get('awaiting_slots') or
+            context.user_data.get('awaiting_date_slots')):
         await handle_message(update, context)
     else:
         # Если это не админский запрос, обрабатываем как обычное меню
         await handle_user_menu_selection(update, context)
 
+def profile_imports(top: int = 25):
+    """
+    Запускает импорт бота в отдельном процессе с -X importtime
+    и печатает модули, дольше всего загружающиеся вместе с зависимостями.
+    """
+    project_root = str(Path(__file__).resolve().parents[2])
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [project_root, os.getenv("PYTHONPATH")])))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import src.bot.main"],
+        capture_output=True, text=True, env=env
+    )
+
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except (ValueError, IndexError):
+            continue  # Строка заголовка
+        timings.append((cumulative_us, self_us, parts[2].strip()))
+
+    if result.returncode != 0 or not timings:
+        print(result.stderr[-2000:])
+        return
+
+    total = next((c for c, _, name in timings if name == "src.bot.main"), max(timings)[0])
+    print(f"Импорт src.bot.main: {total / 1000:.0f} мс")
+    print(f"{'суммарно, мс':>14} {'собственное, мс':>16}  модуль")
+    for cumulative_us, self_us, name in sorted(timings, reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:14.1f} {self_us / 1000:16.1f}  {name}")
+
 def main():
     if not TOKEN:
         logger.critical("TELEGRAM_BOT_TOKEN не найден в .env файле.")
@@ -50,6 +89,7 @@ def main():
         app.add_handler(CommandHandler("accept", accept_command))
         app.add_handler(CommandHandler("deny", deny_command))
         app.add_handler(CommandHandler("set_fio", set_fio))
+        app.add_handler(CommandHandler("my_shifts", show_my_shifts))
 
         # Обработка обмена сменами
         app.add_handler(CallbackQueryHandler(handle_exchange_day_selection, pattern="^exchange_day_"))
@@ -77,9 +117,27 @@ def main():
             days=(notify_time[2],)
         )
 
-        app.run_polling()
+        # Рассылка, прерванная прошлой остановкой бота, досылается сразу после запуска
+        app.job_queue.run_once(resume_broadcast_job, when=5)
+
+        # Ежечасная очистка просроченных предложений обмена
+        app.job_queue.run_repeating(compact_exchange_offers_job, interval=3600, first=60)
+
+        # Полная синхронизация ответов: инкрементальная не видит правку старой строки вместе с новыми ответами
+        app.job_queue.run_repeating(resync_responses_job, interval=RESPONSES_RESYNC_INTERVAL, first=120)
+
+        # Процессы отрисовки запускаются заранее, чтобы первый запрос расписания не ждал их старта
+        render_service.start()
+        try:
+            app.run_polling()
+        finally:
+            render_service.shutdown()
     except Exception as e:
         logger.critical(f"Ошибка запуска: {e}")
         raise
 if __name__ == '__main__':
-    main()
+    # python -m src.bot.main --profile-imports — профиль времени импорта вместо запуска бота
+    if "--profile-imports" in sys.argv[1:]:
+        profile_imports()
+    else:
+        main()
@@ -1,154 +1,216 @@
-import json
-from pathlib import Path
+import atexit
+import logging
+import threading
 
-class UserManager:
-    def __init__(self):
-        # Используем абсолютные пути
-        base_dir = Path(__file__).parent.parent.parent
-        self.users_file = base_dir / "data" / "users.json"
-        self.pending_users_file = base_dir / "data" / "pending_users.json"
+from src.core.backends import get_backend
 
-        self._ensure_file(self.users_file)
-        self._ensure_file(self.pending_users_file)
+logger = logging.getLogger(__name__)
 
-    def _ensure_file(self, filename):
-        filename.parent.mkdir(parents=True, exist_ok=True)
-        if not filename.exists():
-            with open(filename, "w", encoding="utf-8") as f:  # FIXED: Добавлена кодировка
-                json.dump([], f, ensure_ascii=False)  # FIXED: Отключен Unicode-escape
+
+class UserManager:
+    """
+    Пользователи хранятся в памяти с индексами по chat_id и ФИО.
+    Изменения записываются в хранилище отложенно: серия правок в течение FLUSH_DELAY секунд
+    сохраняется одной записью.
+    Методы чтения возвращают копии записей: менять пользователей можно только через методы менеджера,
+    иначе изменения не попадут в индексы и в хранилище.
+    """
+    _instance = None
+
+    FLUSH_DELAY = 0.5
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(UserManager, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+        self._initialized = True
+
+        self._backend = get_backend()
+        self._lock = threading.RLock()
+        self._flush_timer = None
+        self._changed_ids = set()
+        self._removed_ids = set()
+        self._pending_dirty = False
+
+        self._users = self._backend.load_users()
+        self._pending_users = self._backend.load_pending_users()
+        self._reindex()
+
+        atexit.register(self.flush)
+
+    def _reindex(self):
+        self._by_chat_id = {user.get('chat_id'): user for user in self._users}
+        self._by_fio = {}
+        for user in self._users:
+            if user.get('fio'):
+                self._by_fio.setdefault(user['fio'], user)
+        self._pending_set = set(self._pending_users)
+
+    def _index_fio(self, user, old_fio=None):
+        if old_fio and self._by_fio.get(old_fio) is user:
+            del self._by_fio[old_fio]
+        if user.get('fio'):
+            self._by_fio.setdefault(user['fio'], user)
 
     def get_approved_users(self):
         """Возвращает только одобренных пользователей"""
-        users = self.load_users()
-        return {user['chat_id']: user for user in users if user.get('approved')}
+        with self._lock:
+            return {user['chat_id']: dict(user) for user in self._users if user.get('approved')}
 
     def load_users(self):
-        try:
-            with open(self.users_file, "r", encoding="utf-8") as f:  # FIXED: Указана кодировка
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            return []
+        with self._lock:
+            return [dict(user) for user in self._users]
 
     def save_user(self, chat_id, username=None, name=None, fio=None, approved=False):
-        users = self.load_users()
-
-        for user in users:
-            if user.get('chat_id') == chat_id:
+        with self._lock:
+            user = self._by_chat_id.get(chat_id)
+            if user is not None:
                 # Обновляем существующего пользователя
                 if username is not None:
                     user['username'] = username
                 if name is not None:
                     user['name'] = name
                 if fio is not None:
+                    old_fio = user.get('fio')
                     user['fio'] = fio
+                    self._index_fio(user, old_fio)
                 user['approved'] = approved
-                self._save_users(users)
+                self._mark_user_changed(chat_id)
                 return False
 
             # Добавляем нового пользователя
-        new_user = {
-            'chat_id': chat_id,
-            'username': username,
-            'name': name,
-            'fio': fio,
-            'approved': approved
-        }
-        users.append(new_user)
-        self._save_users(users)
-        return True
+            new_user = {
+                'chat_id': chat_id,
+                'username': username,
+                'name': name,
+                'fio': fio,
+                'approved': approved
+            }
+            self._users.append(new_user)
+            self._by_chat_id[chat_id] = new_user
+            self._index_fio(new_user)
+            self._mark_user_changed(chat_id)
+            return True
 
     def update_user_fio(self, chat_id, fio):
         """Обновляет ФИО пользователя с проверками"""
         if not fio or not isinstance(fio, str):
             return False
 
-        users = self.load_users()
-        for user in users:
-            if user.get('chat_id') == chat_id:
-                # Проверяем, что у пользователя ещё нет ФИО
-                if user.get('fio'):
-                    return False
-                user['fio'] = fio
-                self._save_users(users)
-                return True
-        return False
+        with self._lock:
+            user = self._by_chat_id.get(chat_id)
+            # Проверяем, что у пользователя ещё нет ФИО
+            if user is None or user.get('fio'):
+                return False
+            user['fio'] = fio
+            self._index_fio(user)
+            self._mark_user_changed(chat_id)
+            return True
 
     def get_user_by_fio(self, fio):
-        users = self.load_users()
-        for user in users:
-            if user.get('fio') == fio:
-                return user
-        return None
+        with self._lock:
+            user = self._by_fio.get(fio)
+            return dict(user) if user is not None else None
 
     def load_pending_users(self):
-        try:
-            with open(self.pending_users_file, "r", encoding="utf-8") as f:  # FIXED: Указана кодировка
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            return []
+        with self._lock:
+            return list(self._pending_users)
 
     def save_pending_user(self, chat_id):
-        pending_users = self.load_pending_users()
-        if chat_id not in pending_users:
-            pending_users.append(chat_id)
-            with open(self.pending_users_file, "w", encoding="utf-8") as f:  # FIXED
-                json.dump(pending_users, f, ensure_ascii=False)  # FIXED: Отключен Unicode-escape
-            return True
-        return False
+        with self._lock:
+            if chat_id not in self._pending_set:
+                self._pending_users.append(chat_id)
+                self._pending_set.add(chat_id)
+                self._mark_pending_dirty()
+                return True
+            return False
 
     def accept_user(self, chat_id):
-        pending_users = self.load_pending_users()
-        if chat_id in pending_users:
-            pending_users.remove(chat_id)
-            with open(self.pending_users_file, "w", encoding="utf-8") as f:  # FIXED
-                json.dump(pending_users, f, ensure_ascii=False)  # FIXED
-
-        users = self.load_users()
-        for user in users:
-            if user.get('chat_id') == chat_id:
+        with self._lock:
+            self._remove_pending(chat_id)
+
+            user = self._by_chat_id.get(chat_id)
+            if user is not None:
                 user['approved'] = True
-                self._save_users(users)
+                self._mark_user_changed(chat_id)
                 return True
 
-        new_user = {
-            'chat_id': chat_id,
-            'approved': True
-        }
-        users.append(new_user)
-        self._save_users(users)
-        return True
+            new_user = {
+                'chat_id': chat_id,
+                'approved': True
+            }
+            self._users.append(new_user)
+            self._by_chat_id[chat_id] = new_user
+            self._mark_user_changed(chat_id)
+            return True
 
     def deny_user(self, chat_id):
-        removed = False
-
-        pending_users = self.load_pending_users()
-        if chat_id in pending_users:
-            pending_users.remove(chat_id)
-            with open(self.pending_users_file, "w", encoding="utf-8") as f:  # FIXED
-                json.dump(pending_users, f, ensure_ascii=False)  # FIXED
-            removed = True
+        with self._lock:
+            removed = self._remove_pending(chat_id)
 
-        users = self.load_users()
-        new_users = [user for user in users if user.get('chat_id') != chat_id]
+            user = self._by_chat_id.pop(chat_id, None)
+            if user is not None:
+                self._users.remove(user)
+                if user.get('fio') and self._by_fio.get(user['fio']) is user:
+                    del self._by_fio[user['fio']]
+                self._changed_ids.discard(chat_id)
+                self._removed_ids.add(chat_id)
+                self._schedule_flush()
+                removed = True
 
-        if len(new_users) < len(users):
-            self._save_users(new_users)
-            removed = True
-
-        return removed
+            return removed
 
     def is_approved(self, chat_id):
-        users = self.load_users()
-        return any(user.get('chat_id') == chat_id and user.get('approved') for user in users)
-
+        user = self._by_chat_id.get(chat_id)
+        return bool(user and user.get('approved'))
 
     def get_user_info(self, chat_id):
-        users = self.load_users()
-        for user in users:
-            if user.get('chat_id') == chat_id:
-                return user
-        return None
-
-    def _save_users(self, users):
-        with open(self.users_file, "w", encoding="utf-8") as f:  # FIXED: Указана кодировка
-            json.dump(users, f, indent=2, ensure_ascii=False)  # FIXED: Отключен Unicode-escape
\ No newline at end of file
+        with self._lock:
+            user = self._by_chat_id.get(chat_id)
+            return dict(user) if user is not None else None
+
+    def _remove_pending(self, chat_id):
+        if chat_id not in self._pending_set:
+            return False
+        self._pending_users.remove(chat_id)
+        self._pending_set.discard(chat_id)
+        self._mark_pending_dirty()
+        return True
+
+    def _mark_user_changed(self, chat_id):
+        self._changed_ids.add(chat_id)
+        self._removed_ids.discard(chat_id)
+        self._schedule_flush()
+
+    def _mark_pending_dirty(self):
+        self._pending_dirty = True
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.FLUSH_DELAY, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def flush(self):
+        """Записывает накопленные изменения в хранилище"""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+
+            try:
+                if self._changed_ids or self._removed_ids:
+                    self._backend.save_users(self._users, changed=self._changed_ids, removed=self._removed_ids)
+                    self._changed_ids = set()
+                    self._removed_ids = set()
+                if self._pending_dirty:
+                    self._backend.save_pending_users(self._pending_users)
+                    self._pending_dirty = False
+            except Exception as e:
+                logger.error(f"Ошибка сохранения пользователей: {e}")
@@ -3,6 +3,7 @@ from telegram.ext import ContextTypes
 import logging
 from src.bot.handlers import (
     show_schedule,
+    show_my_shifts,
     add_slots,
     help_command, start_shift_exchange
 )
@@ -48,6 +49,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Показываем меню (из user_menu.py)
         keyboard = [
             ["📅 Посмотреть расписание"],
+            ["🗓 Мои смены"],
             ["➕ Запросить добавление смен"],
             ["🔄 Запросить обмен сменами"],
             ["📝 Установить ФИО"],
@@ -69,6 +71,8 @@ async def handle_user_menu_selection(update, context):
 
     if text == "📅 Посмотреть расписание":
         await show_schedule(update, context)
+    elif text == "🗓 Мои смены":
+        await show_my_shifts(update, context)
     elif text == "➕ Запросить добавление смен":
         await add_slots(update, context)
     elif text == "🔄 Запросить обмен сменами":
@@ -1,103 +1,266 @@
+import asyncio
 import os
-import pandas as pd
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Optional
+
+from telegram import InputMediaPhoto
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 
-from src.core.google_utils import GoogleSheetsManager
-from src.core.scheduler import generate_schedule, build_schedule_table
-from src.core.storage import load_shifts, save_schedule
-from src.utils.utils import save_schedule_image
+from src.bot.broadcast import Broadcaster, load_pending_broadcast
+from src.core.availability import Availability
+from src.core.google_utils import GoogleSheetsManager, AsyncSheetsManager
+from src.core.horizon import publish_upcoming_week
+from src.core.scheduler import build_schedule_table
+from src.core.storage import save_schedule_file_ids, load_schedule_file_ids, \
+    compact_exchange_offers, load_schedule, schedule_version
+from src.utils.render_cache import make_render_key, render_cache
+from src.utils.render_service import render_service
+from src.utils.utils import SCHEDULE_IMAGE_DPI
 import logging
 
 gs_manager = GoogleSheetsManager()
+sheets = AsyncSheetsManager(gs_manager)
 logger = logging.getLogger(__name__)
 
-async def auto_send_schedule(context: ContextTypes.DEFAULT_TYPE):
-    try:
-        # Получаем данные и генерируем расписание один раз
-        data = gs_manager.get_clean_data()
-        if not data:
-            raise ValueError("Нет данных для формирования графика")
+# Способ отрисовки изображения: "matplotlib" (таблица matplotlib) или "pillow" (прямой растр, быстрее)
+SCHEDULE_RENDERER = os.getenv("SCHEDULE_RENDERER", "matplotlib")
+# Сколько сотрудников помещается на одну страницу изображения
+ROSTER_PAGE_SIZE = int(os.getenv("ROSTER_PAGE_SIZE", "40"))
+# Ограничение Telegram на число фотографий в одном альбоме
+MEDIA_GROUP_SIZE = 10
+# Как часто (в секундах) ответы формы перечитываются целиком, чтобы подхватить правки старых ответов
+RESPONSES_RESYNC_INTERVAL = int(os.getenv("RESPONSES_RESYNC_INTERVAL", "21600"))
 
-        if not gs_manager.remove_duplicates():
-            raise ValueError("Не удалось очистить дубликаты")
 
-        # Обновляем данные после удаления дубликатов (на всякий случай)
-        data = gs_manager.get_clean_data()
+def schedule_render_key(schedule_data: dict, employee_names: list, availability: dict) -> str:
+    """Ключ изображения расписания: одинаковое содержимое даёт одинаковую картинку"""
+    return make_render_key(
+        schedule_data,
+        availability,
+        {
+            "dpi": SCHEDULE_IMAGE_DPI,
+            "rows": employee_names,
+            "renderer": SCHEDULE_RENDERER,
+            "page_size": ROSTER_PAGE_SIZE
+        }
+    )
 
-        df = pd.DataFrame(data)
-        shifts = load_shifts()
-        schedule_data, unfilled = generate_schedule(df, shifts)
 
-        # Сохраняем расписание
-        save_schedule(schedule_data)
+# Сколько текстов "мои смены" хранится в памяти
+MY_SHIFTS_CACHE_SIZE = 1024
+_my_shifts_cache = OrderedDict()
 
-        # Формируем таблицу
-        table = build_schedule_table(
-            schedule_data,
-            df["ФИО"].tolist(),
-            {row["ФИО"]: row["Дни"] for row in data}
+
+def my_shifts_text(fio: str) -> Optional[str]:
+    """
+    Текст со сменами одного сотрудника и его напарниками по дням; None, если расписания ещё нет.
+    Результат кэшируется по (версия расписания, ФИО), при попадании расписание не загружается.
+    """
+    # Версия берётся до загрузки: если расписание сохранят между ними, запись просто не пригодится
+    key = (schedule_version(), fio)
+    text = _my_shifts_cache.get(key)
+    if text is not None:
+        _my_shifts_cache.move_to_end(key)
+        return text
+
+    schedule_data = load_schedule()
+    if not schedule_data:
+        return None
+
+    lines = []
+    for day, staff in schedule_data.items():
+        if fio in staff:
+            colleagues = [name for name in staff if name != fio]
+            lines.append(f"✅ {day}" + (f" (вместе с: {', '.join(colleagues)})" if colleagues else ""))
+
+    if lines:
+        text = f"🗓 Ваши смены, {fio}:\n\n" + "\n".join(lines)
+    else:
+        text = f"ℹ️ {fio}, в текущем расписании у вас нет смен."
+
+    _my_shifts_cache[key] = text
+    if len(_my_shifts_cache) > MY_SHIFTS_CACHE_SIZE:
+        _my_shifts_cache.popitem(last=False)
+    return text
+
+
+async def render_schedule_pages(key: str, schedule_data: dict, employee_names: list, availability: dict) -> list:
+    """
+    Возвращает PNG-страницы расписания по ROSTER_PAGE_SIZE сотрудников на каждой.
+    Страницы берутся из кэша или рисуются в пуле процессов отрисовки.
+    """
+    cells, rows, columns = build_schedule_table(schedule_data, employee_names, availability, as_array=True)
+
+    async def render_page(page: int, start: int) -> bytes:
+        # Ключ становится именем файла в кэше, поэтому без ":" (недопустим в именах файлов Windows)
+        page_key = f"{key}-{page}"
+        cached = render_cache.get(page_key)
+        if cached is not None:
+            return cached
+        photo_data = await render_service.render(
+            page_key, SCHEDULE_RENDERER,
+            cells[start:start + ROSTER_PAGE_SIZE], rows[start:start + ROSTER_PAGE_SIZE], columns,
+            SCHEDULE_IMAGE_DPI
         )
+        render_cache.put(page_key, photo_data)
+        return photo_data
+
+    starts = range(0, max(len(rows), 1), ROSTER_PAGE_SIZE)
+    return list(await asyncio.gather(*(render_page(page, start) for page, start in enumerate(starts))))
+
+
+async def send_schedule_pages(bot, chat_id, pages: list, caption: str, throttle=None) -> list:
+    """
+    Отправляет страницы расписания (байты или file_id): одну — фотографией,
+    несколько — альбомами до MEDIA_GROUP_SIZE штук. Возвращает file_id отправленных страниц.
+    throttle (корутина без аргументов) ожидается перед каждым запросом к Telegram.
+    """
+    if len(pages) == 1:
+        if throttle:
+            await throttle()
+        message = await bot.send_photo(chat_id=chat_id, photo=pages[0], caption=caption)
+        return [message.photo[-1].file_id]
+
+    file_ids = []
+    for start in range(0, len(pages), MEDIA_GROUP_SIZE):
+        chunk = pages[start:start + MEDIA_GROUP_SIZE]
+        if throttle:
+            await throttle()
+        if len(chunk) == 1:
+            # Альбом не может состоять из одной фотографии
+            message = await bot.send_photo(chat_id=chat_id, photo=chunk[0])
+            file_ids.append(message.photo[-1].file_id)
+            continue
+        media = [
+            InputMediaPhoto(page, caption=caption if start + i == 0 else None)
+            for i, page in enumerate(chunk)
+        ]
+        messages = await bot.send_media_group(chat_id=chat_id, media=media)
+        file_ids.extend(message.photo[-1].file_id for message in messages)
+    return file_ids
+
+
+async def broadcast_schedule(bot, chat_ids, broadcast_id: str, payload: dict) -> dict:
+    """
+    Рассылает расписание, описанное в payload: schedule, availability (список [ФИО, дни, предпочтения]),
+    render_key, caption и, если страницы уже загружались, file_ids.
+    payload сохраняется в состоянии рассылки, поэтому прерванную рассылку можно дослать тем же расписанием.
+    """
+    records = [Availability(*item) for item in payload["availability"]]
+    employee_names = [record.fio for record in records]
+    availability = {record.fio: record for record in records}
+
+    # Байты загружаются один раз, дальше используются file_id, которые вернул Telegram
+    pages = None
+    if not payload.get("file_ids"):
+        # Формируем изображение (результат попадает в кэш для последующих просмотров)
+        pages = await render_schedule_pages(payload["render_key"], payload["schedule"], employee_names, availability)
+    upload_lock = asyncio.Lock()
+
+    async def send(chat_id, throttle):
+        if not payload.get("file_ids"):
+            async with upload_lock:
+                if not payload.get("file_ids"):
+                    file_ids = await send_schedule_pages(bot, chat_id, pages, payload["caption"], throttle)
+                    save_schedule_file_ids(payload["render_key"], file_ids)
+                    payload["file_ids"] = file_ids
+                    return
+
+        await send_schedule_pages(bot, chat_id, payload["file_ids"], payload["caption"], throttle)
+
+    return await Broadcaster().run(broadcast_id, chat_ids, send, payload)
 
-        # Создаем временный файл с уникальным именем
-        temp_filename = "temp_schedule_shared.png"
-        save_schedule_image(table, temp_filename)
+
+async def auto_send_schedule(context: ContextTypes.DEFAULT_TYPE) -> Optional[dict]:
+    """Публикует расписание следующей недели и рассылает его; возвращает итог рассылки или None при ошибке"""
+    try:
+        # Получаем данные и генерируем расписание один раз
+        records = await sheets.get_latest_availability()
+        if not records:
+            raise ValueError("Нет данных для формирования графика")
+
+        # Пересчитываем горизонт и публикуем следующую неделю; генерация занимает процессор,
+        # поэтому выполняется в пуле потоков, чтобы не останавливать обработку остальных чатов
+        loop = asyncio.get_running_loop()
+        _, schedule_data, unfilled = await loop.run_in_executor(None, publish_upcoming_week, records)
+
+        employee_names = [record.fio for record in records]
+        availability = {record.fio: record for record in records}
+        render_key = schedule_render_key(schedule_data, employee_names, availability)
 
         # Формируем подпись
         caption = "📅 Актуальное расписание смен\n✅ - работаете\n❌ - могли бы работать\n\n"
         if unfilled:
             caption += "⚠ Не заполнены смены:\n" + "\n".join(f"- {day}: {count}" for day, count in unfilled)
 
-        # Читаем файл один раз в память
-        with open(temp_filename, "rb") as photo:
-            photo_data = photo.read()
-
-        # Отправляем всем пользователям
-        for chat_id in context.bot_data['user_manager'].get_approved_users():
-            try:
-                await context.bot.send_photo(
-                    chat_id=chat_id,
-                    photo=photo_data,
-                    caption=caption
-                )
-            except Exception as e:
-                logger.error(f"Ошибка отправки {chat_id}: {e}")
+        payload = {
+            "schedule": schedule_data,
+            "availability": [list(record) for record in records],
+            "render_key": render_key,
+            "caption": caption,
+            "created_at": time.time()
+        }
 
-        # Удаляем временный файл
-        os.unlink(temp_filename)
+        # Идентификатор рассылки позволяет дослать расписание после падения в тот же день
+        broadcast_id = f"{date.today().isoformat()}:{render_key}"
+        return await broadcast_schedule(
+            context.bot,
+            context.bot_data['user_manager'].get_approved_users(),
+            broadcast_id,
+            payload
+        )
 
     except Exception as e:
         logger.error(f"Ошибка рассылки: {e}")
 
+
+async def resume_broadcast_job(context: ContextTypes.DEFAULT_TYPE):
+    """Досылает рассылку, прерванную остановкой бота, тем же расписанием и теми же file_id"""
+    try:
+        pending = load_pending_broadcast()
+        if pending is None:
+            return
+        broadcast_id, payload, chat_ids = pending
+        logger.info(f"Досылаем рассылку {broadcast_id}: осталось {len(chat_ids)} получателей")
+        await broadcast_schedule(context.bot, chat_ids, broadcast_id, payload)
+    except Exception as e:
+        logger.error(f"Ошибка возобновления рассылки: {e}")
+
 async def send_saved_schedule(chat_id, context, schedule_data):
     """
     Отправляет сохранённое расписание без пересчёта
     """
     try:
         # Получаем данные из Google Sheets только для информации о доступных днях
-        data = gs_manager.get_clean_data()
-        df = pd.DataFrame(data) if data else pd.DataFrame()
-
-        # Формируем таблицу
-        table = build_schedule_table(
-            schedule_data,
-            df["ФИО"].tolist() if not df.empty else [],
-            {row["ФИО"]: row["Дни"] for row in data} if data else {}
-        )
-
-        # Сохраняем и отправляем изображение
-        temp_filename = f"temp_schedule_{chat_id}.png"
-        save_schedule_image(table, temp_filename)
+        records = await sheets.get_latest_availability()
+        employee_names = [record.fio for record in records]
+        availability = {record.fio: record for record in records}
+        render_key = schedule_render_key(schedule_data, employee_names, availability)
 
         caption = "📅 Текущее расписание смен\n✅ - работаете\n❌ - могли бы работать"
 
-        with open(temp_filename, "rb") as photo:
-            await context.bot.send_photo(
-                chat_id=chat_id,
-                photo=photo,
-                caption=caption
-            )
+        # Если эти страницы уже загружались в Telegram, отправляем их по file_id
+        file_ids = load_schedule_file_ids(render_key)
+        if file_ids:
+            try:
+                await send_schedule_pages(context.bot, chat_id, file_ids, caption)
+                return
+            except BadRequest as e:
+                logger.warning(f"Сохранённые file_id недействительны, загружаем заново: {e}")
+
+        # Берём страницы из кэша или рисуем их
+        pages = await render_schedule_pages(
+            render_key,
+            schedule_data,
+            employee_names,
+            availability
+        )
 
-        os.unlink(temp_filename)
+        file_ids = await send_schedule_pages(context.bot, chat_id, pages, caption)
+        save_schedule_file_ids(render_key, file_ids)
 
     except Exception as e:
         error_msg = str(e) if str(e) else "Неизвестная ошибка"
@@ -105,4 +268,21 @@ async def send_saved_schedule(chat_id, context, schedule_data):
         await context.bot.send_message(
             chat_id=chat_id,
             text=f"⚠️ Не удалось загрузить расписание: {error_msg}"
-        )
\ No newline at end of file
+        )
+
+
+async def compact_exchange_offers_job(context: ContextTypes.DEFAULT_TYPE):
+    """Периодическая очистка просроченных предложений обмена"""
+    try:
+        compact_exchange_offers()
+    except Exception as e:
+        logger.error(f"Ошибка очистки предложений обмена: {e}")
+
+
+async def resync_responses_job(context: ContextTypes.DEFAULT_TYPE):
+    """Периодическая полная синхронизация ответов формы"""
+    try:
+        records = await sheets.get_clean_data(force_refresh=True)
+        logger.info(f"Полная синхронизация ответов: {len(records)} записей")
+    except Exception as e:
+        logger.error(f"Ошибка полной синхронизации ответов: {e}")
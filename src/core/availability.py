@@ -0,0 +1,82 @@
+import re
+from functools import lru_cache
+from typing import Dict, List, NamedTuple
+
+WEEKDAYS = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
+DAY_BITS = {day: 1 << i for i, day in enumerate(WEEKDAYS)}
+
+# Google Forms склеивает отмеченные варианты через ", "
+DAYS_SEPARATOR = re.compile(r"\s*[,;\n]\s*")
+
+# Необязательный столбец формы с днями, в которые сотрудник предпочёл бы работать
+PREFERENCE_COLUMN = "Предпочтительные дни"
+
+
+class Availability(NamedTuple):
+    """Разобранный ответ формы: ФИО и дни недели в виде битовых масок (бит i — WEEKDAYS[i])"""
+    fio: str
+    days: int
+    preferred: int = 0
+
+    def can_work(self, day: str) -> bool:
+        return bool(self.days & DAY_BITS.get(day, 0))
+
+    def prefers(self, day: str) -> bool:
+        return bool(self.preferred & DAY_BITS.get(day, 0))
+
+    @property
+    def day_set(self) -> frozenset:
+        return frozenset(day for day, bit in DAY_BITS.items() if self.days & bit)
+
+
+def parse_days(raw) -> set:
+    """Разбирает ответ из столбца "Дни" в множество названий дней"""
+    if isinstance(raw, (list, tuple, set, frozenset)):
+        return set(raw)
+    if not isinstance(raw, str):
+        return set()
+    return {token for token in DAYS_SEPARATOR.split(raw.strip()) if token}
+
+
+@lru_cache(maxsize=4096)
+def _mask_from_string(raw: str) -> int:
+    mask = 0
+    for day in parse_days(raw):
+        mask |= DAY_BITS.get(day, 0)
+    return mask
+
+
+def days_mask(raw) -> int:
+    """Битовая маска дней недели; разбор одинаковых строк кэшируется"""
+    if isinstance(raw, Availability):
+        return raw.days
+    if isinstance(raw, str):
+        return _mask_from_string(raw)
+    mask = 0
+    for day in parse_days(raw):
+        mask |= DAY_BITS.get(day, 0)
+    return mask
+
+
+def parse_response(record: Dict[str, str]) -> Availability:
+    """Превращает строку ответа формы в Availability"""
+    return Availability(
+        fio=record.get("ФИО", ""),
+        days=days_mask(record.get("Дни", "")),
+        preferred=days_mask(record.get(PREFERENCE_COLUMN, "")),
+    )
+
+
+def parse_responses(responses) -> List[Availability]:
+    """
+    Приводит ответы (записи формы, DataFrame или уже разобранные Availability) к списку Availability.
+    Для повторяющихся ФИО остаётся последний ответ, порядок сотрудников — по первому появлению.
+    """
+    if hasattr(responses, "to_dict"):  # pandas.DataFrame
+        responses = responses.to_dict("records")
+
+    latest = {}
+    for item in responses:
+        parsed = item if isinstance(item, Availability) else parse_response(item)
+        latest[parsed.fio] = parsed
+    return list(latest.values())
@@ -0,0 +1,519 @@
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).parent.parent.parent / "data"
+
+USER_FIELDS = ("chat_id", "username", "name", "fio", "approved")
+
+
+class StorageBackend(ABC):
+    """
+    Интерфейс хранилища состояния бота: пользователи, слоты, расписание и предложения обмена.
+    Реализации: JsonBackend (файлы в data/) и SqliteBackend (data/shiftschedule.db).
+    Бэкенд, в котором реализованы не все методы, нельзя создать.
+    """
+
+    # Пользователи
+    @abstractmethod
+    def load_users(self) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_users(self, users: List[Dict[str, Any]], changed: Optional[Iterable[int]] = None,
+                   removed: Optional[Iterable[int]] = None):
+        """
+        Сохраняет пользователей. users — полный список; changed/removed — chat_id изменённых
+        и удалённых записей (если переданы, бэкенд может обновить только их).
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_pending_users(self) -> List[int]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_pending_users(self, pending: List[int]):
+        raise NotImplementedError
+
+    # Слоты и расписание
+    @abstractmethod
+    def load_shifts(self) -> Optional[Dict[str, int]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_shifts(self, shifts: Dict[str, int]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_document(self, name: str) -> Any:
+        """Загружает JSON-документ (текущее расписание, file_id изображения и т.п.)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_document(self, name: str, value: Any):
+        """Сохраняет JSON-документ; None удаляет его"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def transaction(self):
+        """Контекст для группы операций чтения-изменения-записи, которые не пересекаются с другими"""
+        raise NotImplementedError
+
+    # Предложения обмена
+    @abstractmethod
+    def load_exchange_offers(self) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def upsert_exchange_offer(self, offer: Dict[str, Any]):
+        """Добавляет или обновляет предложение по его полю 'id'"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_exchange_offers(self, offer_ids: Iterable[str]):
+        raise NotImplementedError
+
+
+class JsonBackend(StorageBackend):
+    """
+    Хранение в отдельных JSON-файлах; каждая запись атомарно заменяет файл целиком.
+    Предложения обмена меняются часто, поэтому изменения дописываются строкой в журнал
+    exchange_offers.jsonl, а снимок exchange_offers.json переписывается только при уплотнении журнала.
+    """
+
+    # Журнал уплотняется, когда в нём больше строк, чем max(JOURNAL_COMPACT_MIN, 2 * число предложений)
+    JOURNAL_COMPACT_MIN = 200
+
+    def __init__(self, data_dir: Path = None):
+        self.data_dir = Path(data_dir or DATA_DIR)
+        self._lock = threading.RLock()
+        self._offers = None
+        self._journal_lines = 0
+
+    def _path(self, name: str) -> Path:
+        return self.data_dir / f"{name}.json"
+
+    def _read(self, name: str, default=None):
+        try:
+            with open(self._path(name), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return default
+        except json.JSONDecodeError as e:
+            logger.error(f"Повреждён файл {self._path(name)}: {e}")
+            return default
+
+    def _write(self, name: str, value, indent=2):
+        path = self._path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def load_users(self):
+        return self._read("users", [])
+
+    def save_users(self, users, changed=None, removed=None):
+        with self._lock:
+            self._write("users", users)
+
+    def load_pending_users(self):
+        return self._read("pending_users", [])
+
+    def save_pending_users(self, pending):
+        with self._lock:
+            self._write("pending_users", pending, indent=None)
+
+    def load_shifts(self):
+        return self._read("shifts")
+
+    def save_shifts(self, shifts):
+        with self._lock:
+            self._write("shifts", shifts)
+
+    def load_document(self, name):
+        return self._read(name)
+
+    def save_document(self, name, value):
+        with self._lock:
+            if value is None:
+                try:
+                    self._path(name).unlink()
+                except FileNotFoundError:
+                    pass
+            else:
+                self._write(name, value)
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            yield
+
+    def _journal_path(self) -> Path:
+        return self.data_dir / "exchange_offers.jsonl"
+
+    def _load_offers(self) -> Dict[str, Dict[str, Any]]:
+        """Снимок предложений с применённым журналом; читается с диска один раз"""
+        if self._offers is None:
+            offers = {}
+            for i, offer in enumerate(self._read("exchange_offers", [])):
+                offer.setdefault('id', f"legacy-{i}")
+                offers[offer['id']] = offer
+
+            self._journal_lines = 0
+            damaged = False
+            try:
+                with open(self._journal_path(), "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except json.JSONDecodeError:
+                            # Недописанная строка после аварийного завершения
+                            logger.warning(f"Пропущена повреждённая строка журнала {self._journal_path()}")
+                            damaged = True
+                            continue
+                        self._journal_lines += 1
+                        if entry.get('op') == "upsert":
+                            offers[entry['offer']['id']] = entry['offer']
+                        elif entry.get('op') == "delete":
+                            for offer_id in entry.get('ids', []):
+                                offers.pop(offer_id, None)
+            except FileNotFoundError:
+                pass
+            self._offers = offers
+            if damaged:
+                # Новые строки нельзя дописывать после оборванной, поэтому журнал сразу уплотняется
+                self._compact_journal()
+        return self._offers
+
+    def _append_journal(self, entry: Dict[str, Any]):
+        path = self._journal_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_lines += 1
+
+        if self._journal_lines > max(self.JOURNAL_COMPACT_MIN, 2 * len(self._offers)):
+            self._compact_journal()
+
+    def _compact_journal(self):
+        """Записывает снимок текущих предложений и очищает журнал"""
+        # Если процесс упадёт между записью снимка и очисткой журнала, повторное применение журнала безопасно
+        self._write("exchange_offers", list(self._offers.values()))
+        with open(self._journal_path(), "w", encoding="utf-8") as f:
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_lines = 0
+
+    def has_exchange_offers(self) -> bool:
+        return self._path("exchange_offers").exists() or self._journal_path().exists()
+
+    def load_exchange_offers(self):
+        with self._lock:
+            return [dict(offer) for offer in self._load_offers().values()]
+
+    def upsert_exchange_offer(self, offer):
+        with self._lock:
+            offer = dict(offer)
+            self._load_offers()[offer['id']] = offer
+            self._append_journal({"op": "upsert", "offer": offer})
+
+    def delete_exchange_offers(self, offer_ids):
+        offer_ids = list(offer_ids)
+        if not offer_ids:
+            return
+        with self._lock:
+            offers = self._load_offers()
+            for offer_id in offer_ids:
+                offers.pop(offer_id, None)
+            self._append_journal({"op": "delete", "ids": offer_ids})
+
+
+class SqliteBackend(StorageBackend):
+    """
+    Хранение в локальной базе SQLite в режиме WAL.
+    Каждая операция выполняется в транзакции, пользователи обновляются построчно.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL UNIQUE,
+            username TEXT,
+            name TEXT,
+            fio TEXT,
+            approved INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_users_fio ON users (fio);
+        CREATE INDEX IF NOT EXISTS idx_users_approved ON users (approved);
+
+        CREATE TABLE IF NOT EXISTS pending_users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL UNIQUE
+        );
+
+        CREATE TABLE IF NOT EXISTS shifts (
+            day TEXT PRIMARY KEY,
+            slots INTEGER NOT NULL,
+            position INTEGER NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS documents (
+            name TEXT PRIMARY KEY,
+            body TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS exchange_offers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            offer_id TEXT,
+            from_user INTEGER NOT NULL,
+            to_user INTEGER NOT NULL,
+            day_to_give TEXT,
+            day_to_get TEXT,
+            status TEXT NOT NULL,
+            body TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_offers_pair ON exchange_offers (from_user, to_user, status);
+        CREATE INDEX IF NOT EXISTS idx_offers_status ON exchange_offers (status);
+    """
+
+    def __init__(self, path: Path = None):
+        self.path = Path(path or DATA_DIR / "shiftschedule.db")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        self._depth = 0
+        self._upgrade_schema()
+
+    def _upgrade_schema(self):
+        """Добавляет столбец offer_id в базы, созданные до появления идентификаторов предложений"""
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(exchange_offers)")}
+        with self.transaction():
+            if "offer_id" not in columns:
+                self._conn.execute("ALTER TABLE exchange_offers ADD COLUMN offer_id TEXT")
+            for row in self._conn.execute(
+                    "SELECT id, body FROM exchange_offers WHERE offer_id IS NULL").fetchall():
+                offer = json.loads(row["body"])
+                offer.setdefault('id', f"legacy-{row['id']}")
+                self._conn.execute("UPDATE exchange_offers SET offer_id = ?, body = ? WHERE id = ?",
+                                   (offer['id'], json.dumps(offer, ensure_ascii=False), row["id"]))
+            self._conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_offers_offer_id ON exchange_offers (offer_id)")
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            if self._depth:
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                return
+
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._depth = 1
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            else:
+                self._conn.execute("COMMIT")
+            finally:
+                self._depth = 0
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            for table in ("users", "pending_users", "shifts", "documents", "exchange_offers"):
+                if self._conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+                    return False
+            return True
+
+    @staticmethod
+    def _user_from_row(row) -> Dict[str, Any]:
+        user = {field: row[field] for field in USER_FIELDS}
+        user['approved'] = bool(user['approved'])
+        return user
+
+    def load_users(self):
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {', '.join(USER_FIELDS)} FROM users ORDER BY id").fetchall()
+        return [self._user_from_row(row) for row in rows]
+
+    def _upsert_user(self, user):
+        self._conn.execute(
+            """
+            INSERT INTO users (chat_id, username, name, fio, approved) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(chat_id) DO UPDATE SET
+                username = excluded.username,
+                name = excluded.name,
+                fio = excluded.fio,
+                approved = excluded.approved
+            """,
+            (user.get('chat_id'), user.get('username'), user.get('name'), user.get('fio'),
+             int(bool(user.get('approved'))))
+        )
+
+    def save_users(self, users, changed=None, removed=None):
+        with self.transaction():
+            if changed is None and removed is None:
+                self._conn.execute("DELETE FROM users")
+                for user in users:
+                    self._upsert_user(user)
+                return
+
+            changed = set(changed or ())
+            for user in users:
+                if user.get('chat_id') in changed:
+                    self._upsert_user(user)
+            for chat_id in removed or ():
+                self._conn.execute("DELETE FROM users WHERE chat_id = ?", (chat_id,))
+
+    def load_pending_users(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT chat_id FROM pending_users ORDER BY id").fetchall()
+        return [row["chat_id"] for row in rows]
+
+    def save_pending_users(self, pending):
+        with self.transaction():
+            self._conn.execute("DELETE FROM pending_users")
+            self._conn.executemany("INSERT OR IGNORE INTO pending_users (chat_id) VALUES (?)",
+                                   [(chat_id,) for chat_id in pending])
+
+    def load_shifts(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT day, slots FROM shifts ORDER BY position").fetchall()
+        return {row["day"]: row["slots"] for row in rows} if rows else None
+
+    def save_shifts(self, shifts):
+        with self.transaction():
+            self._conn.execute("DELETE FROM shifts")
+            self._conn.executemany("INSERT INTO shifts (day, slots, position) VALUES (?, ?, ?)",
+                                   [(day, slots, i) for i, (day, slots) in enumerate(shifts.items())])
+
+    def load_document(self, name):
+        with self._lock:
+            row = self._conn.execute("SELECT body FROM documents WHERE name = ?", (name,)).fetchone()
+        return json.loads(row["body"]) if row else None
+
+    def save_document(self, name, value):
+        with self.transaction():
+            if value is None:
+                self._conn.execute("DELETE FROM documents WHERE name = ?", (name,))
+            else:
+                self._conn.execute(
+                    "INSERT INTO documents (name, body) VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET body = excluded.body",
+                    (name, json.dumps(value, ensure_ascii=False))
+                )
+
+    def load_exchange_offers(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT body FROM exchange_offers ORDER BY id").fetchall()
+        return [json.loads(row["body"]) for row in rows]
+
+    def upsert_exchange_offer(self, offer):
+        with self.transaction():
+            self._conn.execute(
+                """
+                INSERT INTO exchange_offers (offer_id, from_user, to_user, day_to_give, day_to_get, status, body)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(offer_id) DO UPDATE SET
+                    status = excluded.status,
+                    body = excluded.body
+                """,
+                (offer.get('id'), offer.get('from_user'), offer.get('to_user'), offer.get('day_to_give'),
+                 offer.get('day_to_get'), offer.get('status'), json.dumps(offer, ensure_ascii=False))
+            )
+
+    def delete_exchange_offers(self, offer_ids):
+        with self.transaction():
+            self._conn.executemany("DELETE FROM exchange_offers WHERE offer_id = ?",
+                                   [(offer_id,) for offer_id in offer_ids])
+
+
+# Документы, которые хранятся целиком (в JsonBackend — по файлу на документ)
+MIGRATED_DOCUMENTS = ("current_schedule", "current_schedule_week", "current_schedule_photo", "schedule_horizon")
+
+
+def migrate_json_to_sqlite(source: JsonBackend = None, target: SqliteBackend = None) -> SqliteBackend:
+    """Переносит данные из JSON-файлов в SQLite одной транзакцией"""
+    source = source or JsonBackend()
+    target = target or SqliteBackend()
+
+    with target.transaction():
+        target.save_users(source.load_users())
+        target.save_pending_users(source.load_pending_users())
+
+        shifts = source.load_shifts()
+        if shifts is not None:
+            target.save_shifts(shifts)
+
+        for name in MIGRATED_DOCUMENTS:
+            value = source.load_document(name)
+            if value is not None:
+                target.save_document(name, value)
+
+        for i, offer in enumerate(source.load_exchange_offers()):
+            offer.setdefault('id', f"legacy-{i}")
+            target.upsert_exchange_offer(offer)
+
+    logger.info(f"Данные из {source.data_dir} перенесены в {target.path}")
+    return target
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> StorageBackend:
+    """
+    Возвращает хранилище, выбранное переменной окружения STORAGE_BACKEND ("json" или "sqlite").
+    При первом запуске SQLite с пустой базой данные из JSON-файлов переносятся автоматически.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            kind = os.getenv("STORAGE_BACKEND", "json").lower()
+            if kind == "sqlite":
+                backend = SqliteBackend()
+                json_backend = JsonBackend()
+                if backend.is_empty() and (json_backend.has_exchange_offers() or any(
+                        json_backend._path(name).exists()
+                        for name in ("users", "pending_users", "shifts") + MIGRATED_DOCUMENTS)):
+                    migrate_json_to_sqlite(target=backend)
+                _backend = backend
+            elif kind == "json":
+                _backend = JsonBackend()
+            else:
+                raise ValueError(f"Неизвестный STORAGE_BACKEND: {kind}")
+        return _backend
+
+
+if __name__ == "__main__":
+    # python -m src.core.backends migrate — перенос JSON-файлов в SQLite
+    if sys.argv[1:] == ["migrate"]:
+        logging.basicConfig(level=logging.INFO)
+        migrate_json_to_sqlite()
+    else:
+        print("Использование: python -m src.core.backends migrate")
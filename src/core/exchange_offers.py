@@ -0,0 +1,159 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from src.core.backends import get_backend
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд предложение обмена ждёт ответа, прежде чем устареть
+OFFER_TTL = float(os.getenv("EXCHANGE_OFFER_TTL", str(48 * 3600)))
+
+STATUS_PENDING = "pending"
+STATUS_SUPERSEDED = "superseded"
+STATUS_EXPIRED = "expired"
+
+
+class ExchangeOfferStore:
+    """
+    Предложения обмена сменами в памяти с индексами по id и по паре (from_user, to_user).
+    Хранилище (JSON или SQLite) используется только для записи изменений.
+    На каждую пару пользователей действует не больше одного ожидающего предложения.
+    """
+
+    def __init__(self, backend=None, ttl: float = OFFER_TTL):
+        self._backend = backend or get_backend()
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._by_pair: Dict[tuple, str] = {}
+
+        for offer in self._backend.load_exchange_offers():
+            if 'id' not in offer or 'created_at' not in offer:
+                offer.setdefault('id', uuid.uuid4().hex)
+                offer.setdefault('created_at', time.time())
+                self._backend.upsert_exchange_offer(offer)
+            self._by_id[offer['id']] = offer
+            if offer.get('status') == STATUS_PENDING:
+                self._by_pair[self._pair(offer)] = offer['id']
+
+    @staticmethod
+    def _pair(offer) -> tuple:
+        return offer.get('from_user'), offer.get('to_user')
+
+    def _is_expired(self, offer, now=None) -> bool:
+        return (now or time.time()) - offer.get('created_at', 0) > self.ttl
+
+    def _set_status(self, offer, status):
+        offer['status'] = status
+        if self._by_pair.get(self._pair(offer)) == offer['id']:
+            del self._by_pair[self._pair(offer)]
+        self._backend.upsert_exchange_offer(offer)
+
+    def add(self, offer: Dict[str, Any]) -> Dict[str, Any]:
+        """Сохраняет новое предложение; предыдущее ожидающее предложение той же пары заменяется"""
+        with self._lock:
+            offer = dict(offer)
+            offer.setdefault('id', uuid.uuid4().hex)
+            offer.setdefault('created_at', time.time())
+            offer.setdefault('status', STATUS_PENDING)
+
+            previous_id = self._by_pair.get(self._pair(offer))
+            if previous_id:
+                self._set_status(self._by_id[previous_id], STATUS_SUPERSEDED)
+
+            self._by_id[offer['id']] = offer
+            if offer['status'] == STATUS_PENDING:
+                self._by_pair[self._pair(offer)] = offer['id']
+            self._backend.upsert_exchange_offer(offer)
+            return offer
+
+    def get(self, offer_id: str) -> Optional[Dict[str, Any]]:
+        return self._by_id.get(offer_id)
+
+    def find_pending(self, from_user, to_user) -> Optional[Dict[str, Any]]:
+        """Ожидающее ответа и не просроченное предложение от from_user к to_user"""
+        with self._lock:
+            offer_id = self._by_pair.get((from_user, to_user))
+            if offer_id is None:
+                return None
+            offer = self._by_id[offer_id]
+            if self._is_expired(offer):
+                self._set_status(offer, STATUS_EXPIRED)
+                return None
+            return offer
+
+    def remove(self, offer: Dict[str, Any]) -> bool:
+        with self._lock:
+            offer_id = offer.get('id')
+            if offer_id is None:
+                # Предложение без id: ищем по содержимому
+                offer_id = next((
+                    o['id'] for o in self._by_id.values()
+                    if self._pair(o) == self._pair(offer)
+                    and o.get('day_to_give') == offer.get('day_to_give')
+                    and o.get('day_to_get') == offer.get('day_to_get')
+                ), None)
+
+            stored = self._by_id.pop(offer_id, None) if offer_id else None
+            if stored is None:
+                return False
+            if self._by_pair.get(self._pair(stored)) == offer_id:
+                del self._by_pair[self._pair(stored)]
+            self._backend.delete_exchange_offers([offer_id])
+            return True
+
+    def supersede_stale(self, schedule: Dict[str, list]) -> int:
+        """
+        Помечает устаревшими ожидающие предложения, смены которых больше не совпадают с расписанием
+        или обмен по которым поставил бы сотрудника в день, где он уже работает
+        """
+        with self._lock:
+            stale = []
+            for offer_id in self._by_pair.values():
+                offer = self._by_id[offer_id]
+                give_staff = schedule.get(offer.get('day_to_give'), [])
+                get_staff = schedule.get(offer.get('day_to_get'), [])
+                if (offer.get('from_user_fio') not in give_staff or
+                        offer.get('to_user_fio') not in get_staff or
+                        offer.get('to_user_fio') in give_staff or
+                        offer.get('from_user_fio') in get_staff):
+                    stale.append(offer)
+
+            for offer in stale:
+                self._set_status(offer, STATUS_SUPERSEDED)
+            if stale:
+                logger.info(f"Устарело предложений обмена после изменения расписания: {len(stale)}")
+            return len(stale)
+
+    def compact(self) -> int:
+        """Удаляет просроченные и закрытые предложения"""
+        with self._lock:
+            now = time.time()
+            to_delete = [
+                offer_id for offer_id, offer in self._by_id.items()
+                if offer.get('status') != STATUS_PENDING or self._is_expired(offer, now)
+            ]
+            for offer_id in to_delete:
+                offer = self._by_id.pop(offer_id)
+                if self._by_pair.get(self._pair(offer)) == offer_id:
+                    del self._by_pair[self._pair(offer)]
+            if to_delete:
+                self._backend.delete_exchange_offers(to_delete)
+                logger.info(f"Удалено устаревших предложений обмена: {len(to_delete)}")
+            return len(to_delete)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_exchange_store() -> ExchangeOfferStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ExchangeOfferStore()
+        return _store
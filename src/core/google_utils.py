@@ -1,7 +1,22 @@
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+import asyncio
+import functools
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, TYPE_CHECKING
+
+from src.core.availability import Availability, parse_responses
+
+if TYPE_CHECKING:
+    import gspread
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -9,28 +24,188 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Форматы столбца "Отметка времени" в выгрузке Google Forms
+TIMESTAMP_FORMATS = ("%d.%m.%Y %H:%M:%S", "%m/%d/%Y %H:%M:%S", "%Y-%m-%d %H:%M:%S")
+
+RESPONSES_STORE_FILE = Path(__file__).parent.parent.parent / "data" / "responses.json"
+
+CREDENTIALS_FILE = "../../config/credentials.json"
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
+]
+
+
+class SheetsUnavailableError(Exception):
+    """Google Sheets недоступен: нет подключения, исчерпаны повторы или открыт предохранитель"""
+
+
+class CircuitBreaker:
+    """
+    Предохранитель: после threshold неудач подряд запросы не выполняются cooldown секунд,
+    затем пропускается одна пробная попытка.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.cooldown:
+                # Пробная попытка; при неудаче предохранитель снова размыкается
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("Google Sheets снова доступен")
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.threshold:
+                if self._opened_at is None:
+                    logger.error(f"Google Sheets недоступен, запросы приостановлены на {self.cooldown:.0f} с")
+                self._opened_at = time.monotonic()
+
+
+def _error_status(error: Exception) -> Optional[int]:
+    """HTTP-статус ошибки gspread/requests, если он есть"""
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def _is_retryable(error: Exception, status: Optional[int]) -> bool:
+    if status is not None:
+        return status in (401, 408, 429) or status >= 500
+    import requests
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError))
+
+
+def _trim_row(row: List[str]) -> List[str]:
+    """Отбрасывает пустые ячейки в конце строки (API Sheets их не возвращает)"""
+    row = list(row)
+    while row and not row[-1]:
+        row.pop()
+    return row
+
+
+def parse_timestamp(value: str) -> datetime:
+    """Разбирает отметку времени формы; нераспознанные значения считаются самыми старыми"""
+    for fmt in TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), fmt)
+        except ValueError:
+            continue
+    return datetime.min
+
+
+def _latest_records(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """По одной (самой свежей по "Отметка времени") записи на каждое ФИО в порядке появления в листе"""
+    latest = {}
+    for i, record in enumerate(records):
+        key = (parse_timestamp(record.get("Отметка времени", "")), i)
+        fio = record.get("ФИО", "")
+        if fio not in latest or key >= latest[fio][0]:
+            latest[fio] = (key, i, record)
+
+    return [record for _, _, record in sorted(latest.values(), key=lambda item: item[1])]
+
 
 class GoogleSheetsManager:
     _instance = None
 
+    # Сколько секунд ответы считаются свежими без проверки изменений в таблице
+    CACHE_TTL = float(os.getenv("SHEETS_CACHE_TTL", "60"))
+    # Не чаще чем раз в столько секунд повторяется неудавшееся подключение
+    RECONNECT_INTERVAL = float(os.getenv("SHEETS_RECONNECT_INTERVAL", "30"))
+    MAX_RETRIES = int(os.getenv("SHEETS_MAX_RETRIES", "4"))
+    RETRY_BASE_DELAY = 1.0
+    RETRY_MAX_DELAY = 8.0
+    # После стольких неудачных запросов подряд Sheets считается недоступным на BREAKER_COOLDOWN секунд
+    BREAKER_THRESHOLD = int(os.getenv("SHEETS_BREAKER_THRESHOLD", "3"))
+    BREAKER_COOLDOWN = float(os.getenv("SHEETS_BREAKER_COOLDOWN", "60"))
+    # Таймауты (подключение, чтение) одного HTTP-запроса к Google API
+    HTTP_TIMEOUT = (5.0, float(os.getenv("SHEETS_HTTP_TIMEOUT", "10")))
+    # Сколько секунд одна операция (обновление ответов, удаление повторов, очистка) тратит на запросы
+    # вместе с повторами. Вместе с REFRESH_WAIT должно быть меньше таймаута AsyncSheetsManager,
+    # иначе при сбое вызывающий код получит пустой результат вместо сохранённых ответов
+    RETRY_BUDGET = float(os.getenv("SHEETS_RETRY_BUDGET", "12"))
+    # Сколько ждёт вызов без кэша, пока другой поток загружает ответы
+    REFRESH_WAIT = float(os.getenv("SHEETS_REFRESH_WAIT", "12"))
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(GoogleSheetsManager, cls).__new__(cls)
-            cls._instance.sheet = cls._instance._connect()
+            # Подключение откладывается до первого обращения к листу
+            cls._instance._sheet = None
+            cls._instance._connect_attempted_at = None
+            cls._instance._connect_lock = threading.Lock()
+            cls._instance._breaker = CircuitBreaker(cls.BREAKER_THRESHOLD, cls.BREAKER_COOLDOWN)
+            # Срок, до которого текущая операция потока может обращаться к листу (см. _budget)
+            cls._instance._local = threading.local()
+            cls._instance._cache = None
+            cls._instance._cache_version = None
+            cls._instance._cache_checked_at = 0.0
+            # _cache_lock защищает только данные в памяти и держится недолго;
+            # _refresh_lock не даёт двум потокам одновременно обращаться к листу за обновлением
+            cls._instance._cache_lock = threading.RLock()
+            cls._instance._refresh_lock = threading.RLock()
+            # Разобранные последние ответы и список записей, из которого они получены
+            cls._instance._availability_source = None
+            cls._instance._availability = []
+            cls._instance._store_headers = None
+            cls._instance._store_rows = []
+            cls._instance._load_store()
         return cls._instance
 
     def __init__(self):
         pass
 
-    def _connect(self) -> Optional[gspread.Worksheet]:
+    @property
+    def sheet(self) -> Optional["gspread.Worksheet"]:
+        """
+        Лист с ответами. Подключение выполняется при первом обращении;
+        после неудачи повторная попытка делается не чаще раза в RECONNECT_INTERVAL секунд.
+        """
+        if self._sheet is None:
+            with self._connect_lock:
+                now = time.monotonic()
+                if self._sheet is None and (self._connect_attempted_at is None or
+                                            now - self._connect_attempted_at >= self.RECONNECT_INTERVAL):
+                    self._connect_attempted_at = now
+                    self._sheet = self._connect()
+        return self._sheet
+
+    def reconnect(self):
+        """Сбрасывает подключение: следующее обращение к листу подключится заново"""
+        with self._connect_lock:
+            self._sheet = None
+            self._connect_attempted_at = None
+
+    def _connect(self) -> Optional["gspread.Worksheet"]:
         """Подключение к Google Sheets с детальным логированием."""
+        import gspread
+
         try:
-            scope = [
-                "https://www.googleapis.com/auth/spreadsheets",
-                "https://www.googleapis.com/auth/drive"
-            ]
-            creds = ServiceAccountCredentials.from_json_keyfile_name("../../config/credentials.json", scope)
-            client = gspread.authorize(creds)
+            # Учётные данные google-auth обновляют токен доступа автоматически
+            client = gspread.service_account(filename=CREDENTIALS_FILE, scopes=SCOPES)
+            # Без таймаута зависший запрос навсегда занимает поток пула Sheets
+            client.set_timeout(self.HTTP_TIMEOUT)
 
             # Проверка существования таблицы "Ответы"
             try:
@@ -54,55 +229,301 @@ class GoogleSheetsManager:
             logger.error(f"Критическая ошибка подключения: {str(e)}", exc_info=True)
             return None
 
-    def get_clean_data(self) -> List[Dict[str, Any]]:
-        """Получает данные, игнорируя полностью пустые строки и очищенные строки"""
-        if not self.sheet:
-            return []
+    @contextmanager
+    def _budget(self):
+        """Ограничивает запросы к листу в этом потоке RETRY_BUDGET секундами (вложенные вызовы делят срок)"""
+        if getattr(self._local, "deadline", None) is not None:
+            yield
+            return
+        self._local.deadline = time.monotonic() + self.RETRY_BUDGET
+        try:
+            yield
+        finally:
+            self._local.deadline = None
+
+    def _call(self, operation: Callable[["gspread.Worksheet"], Any]) -> Any:
+        """
+        Выполняет запрос к листу с повторами при 429, 5xx и сетевых ошибках
+        (экспоненциальная задержка, не больше MAX_RETRIES попыток).
+        Внутри _budget попытка начинается, только если она успеет завершиться (по таймауту чтения) до срока.
+        При 401 подключение создаётся заново. Если Sheets недоступен, выбрасывает SheetsUnavailableError.
+        """
+        if not self._breaker.allow():
+            raise SheetsUnavailableError("Google Sheets временно недоступен")
+
+        deadline = getattr(self._local, "deadline", None)
+        attempt = 0
+        while True:
+            if deadline is not None and time.monotonic() + self.HTTP_TIMEOUT[1] > deadline:
+                raise SheetsUnavailableError("Время на запросы к Google Sheets исчерпано")
+
+            sheet = self.sheet
+            if sheet is None:
+                self._breaker.record_failure()
+                raise SheetsUnavailableError("Нет подключения к Google Sheets")
+
+            try:
+                result = operation(sheet)
+            except Exception as e:
+                status = _error_status(e)
+                if status == 401:
+                    self.reconnect()
+                if not _is_retryable(e, status):
+                    raise
 
+                attempt += 1
+                if attempt >= self.MAX_RETRIES:
+                    self._breaker.record_failure()
+                    raise SheetsUnavailableError(f"Google Sheets не ответил после {attempt} попыток: {e}") from e
+
+                delay = min(self.RETRY_BASE_DELAY * 2 ** (attempt - 1), self.RETRY_MAX_DELAY)
+                delay *= random.uniform(0.5, 1.0)
+                if deadline is not None and time.monotonic() + delay + self.HTTP_TIMEOUT[1] > deadline:
+                    self._breaker.record_failure()
+                    raise SheetsUnavailableError(f"Google Sheets не ответил за отведённое время: {e}") from e
+                logger.warning(f"Ошибка Google Sheets ({status or type(e).__name__}), "
+                               f"повтор через {delay:.1f} с (попытка {attempt + 1} из {self.MAX_RETRIES})")
+                time.sleep(delay)
+                continue
+
+            self._breaker.record_success()
+            return result
+
+    def invalidate_cache(self):
+        """Сбрасывает кэш ответов: следующий get_clean_data перечитает таблицу целиком"""
+        with self._cache_lock:
+            self._cache = None
+            self._cache_version = None
+            self._cache_checked_at = 0.0
+            self._availability_source = None
+            self._store_headers = None
+            self._store_rows = []
+
+    def _load_store(self):
+        """Загружает локальную копию ответов, сохранённую при прошлой синхронизации"""
         try:
-            # Получаем все строки (включая пустые)
-            all_rows = self.sheet.get_all_values()
+            with open(RESPONSES_STORE_FILE, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._store_headers = data["headers"]
+            self._store_rows = data["rows"]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            self._store_headers = None
+            self._store_rows = []
+
+    def _save_store(self):
+        RESPONSES_STORE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = RESPONSES_STORE_FILE.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"headers": self._store_headers, "rows": self._store_rows}, f, ensure_ascii=False)
+        os.replace(tmp_path, RESPONSES_STORE_FILE)
+
+    def sync_responses(self, full: bool = False, changed: bool = False):
+        """
+        Синхронизирует локальную копию ответов с листом.
+        В инкрементальном режиме читается только диапазон от последней известной строки до конца:
+        если эта строка в таблице не изменилась, новые строки дописываются к копии,
+        иначе выполняется полная пересинхронизация.
+        changed означает, что лист точно изменился: если при этом новых строк нет,
+        значит, исправлены прежние ответы, и лист перечитывается целиком.
+        Правку старой строки одновременно с добавлением новых инкрементальный режим не замечает —
+        её подхватывает периодическая полная синхронизация (get_clean_data(force_refresh=True)).
+        Запросы к листу выполняются без _cache_lock, так что чтение кэша в это время не блокируется.
+        """
+        import gspread.utils
 
-            # Фильтруем строки:
-            # 1. Пропускаем заголовок (первую строку)
-            # 2. Оставляем только строки, где есть хотя бы одно заполненное поле
-            clean_data = []
-            headers = all_rows[0] if all_rows else []
+        with self._refresh_lock:
+            with self._cache_lock:
+                headers = self._store_headers
+                known_rows = len(self._store_rows)
+                known = self._store_rows[-1] if self._store_rows else headers
 
-            for row in all_rows[1:]:
-                if any(cell.strip() for cell in row):  # Если есть хоть одно непустое значение
-                    clean_data.append(dict(zip(headers, row)))
+            if not full and headers:
+                width = len(headers)
+                anchor_row = known_rows + 1  # Номер последней известной строки в листе
+                last_col = gspread.utils.rowcol_to_a1(1, width).rstrip("0123456789")
+                fetched = self._call(lambda sheet: sheet.get(f"A{anchor_row}:{last_col}"))
 
-            # Дополнительная проверка структуры
-            if clean_data and not all(col in headers for col in ["ФИО", "Дни"]):
-                logger.error("Отсутствуют обязательные столбцы 'ФИО' или 'Дни'")
-                return []
+                anchored = bool(fetched) and _trim_row(fetched[0]) == _trim_row(known)
+                if anchored and (len(fetched) > 1 or not changed):
+                    new_rows = [
+                        (list(row) + [""] * width)[:width]
+                        for row in fetched[1:]
+                    ]
+                    if new_rows:
+                        with self._cache_lock:
+                            self._store_rows.extend(new_rows)
+                            self._save_store()
+                    logger.info(f"Инкрементальная синхронизация: получено {len(new_rows)} новых строк")
+                    return
 
-            logger.info(f"Загружено {len(clean_data)} записей (пустые строки игнорируются)")
-            return clean_data
+                logger.info("Лист изменён не только добавлением строк, выполняем полную синхронизацию")
+
+            all_rows = self._call(lambda sheet: sheet.get_all_values())
+            with self._cache_lock:
+                self._store_headers = all_rows[0] if all_rows else []
+                self._store_rows = all_rows[1:]
+                self._save_store()
+            logger.info(f"Полная синхронизация: {len(all_rows[1:])} строк")
+
+    def _probe_version(self) -> Optional[str]:
+        """
+        Дешёвая проверка изменений таблицы.
+        Берёт время изменения файла из Drive, а если оно недоступно — число строк и последнюю отметку времени.
+        """
+        try:
+            return self._call(lambda sheet: sheet.spreadsheet.get_lastUpdateTime())
+        except SheetsUnavailableError:
+            return None
+        except Exception as e:
+            logger.debug(f"modifiedTime недоступен, проверяем первый столбец: {e}")
 
+        try:
+            timestamps = self._call(lambda sheet: sheet.col_values(1))
+            return f"{len(timestamps)}:{timestamps[-1] if timestamps else ''}"
         except Exception as e:
-            logger.error(f"Ошибка загрузки данных: {str(e)}", exc_info=True)
+            logger.warning(f"Не удалось проверить изменения таблицы: {e}")
+            return None
+
+    def _fetch_clean_data(self, full: bool = False, changed: bool = False) -> List[Dict[str, Any]]:
+        """Синхронизирует ответы с листом и отбрасывает пустые строки"""
+        # Получаем все строки (включая пустые)
+        self.sync_responses(full=full, changed=changed)
+        with self._cache_lock:
+            clean_data = self._records_from_store()
+        logger.info(f"Загружено {len(clean_data)} записей (пустые строки игнорируются)")
+        return clean_data
+
+    def _records_from_store(self) -> List[Dict[str, Any]]:
+        """Записи из локальной копии ответов без пустых строк"""
+        # Фильтруем строки:
+        # 1. Пропускаем заголовок (первую строку)
+        # 2. Оставляем только строки, где есть хотя бы одно заполненное поле
+        clean_data = []
+        headers = self._store_headers or []
+
+        for row in self._store_rows:
+            if any(cell.strip() for cell in row):  # Если есть хоть одно непустое значение
+                clean_data.append(dict(zip(headers, row)))
+
+        # Дополнительная проверка структуры
+        if clean_data and not all(col in headers for col in ["ФИО", "Дни"]):
+            logger.error("Отсутствуют обязательные столбцы 'ФИО' или 'Дни'")
             return []
 
+        return clean_data
+
+    def get_clean_data(self, force_refresh: bool = False, cached_only: bool = False) -> List[Dict[str, Any]]:
+        """
+        Получает данные, игнорируя полностью пустые строки и очищенные строки.
+        Результат кэшируется на CACHE_TTL секунд; по истечении срока лист перечитывается,
+        только если он действительно изменился, причём дочитываются только новые строки.
+        force_refresh выполняет полную пересинхронизацию.
+        Если Sheets недоступен или лист уже обновляет другой поток, возвращаются последние полученные ответы.
+        cached_only сразу возвращает последние полученные ответы, не обращаясь к листу.
+        """
+        return [dict(record) for record in self._current_records(force_refresh, cached_only)]
+
+    def _current_records(self, force_refresh: bool = False, cached_only: bool = False) -> List[Dict[str, Any]]:
+        """Актуальные записи без копирования; вызывающий код не должен их изменять"""
+        if cached_only:
+            return self._stale_records()
+
+        with self._cache_lock:
+            if self._cache is not None and not force_refresh and \
+                    time.monotonic() - self._cache_checked_at < self.CACHE_TTL:
+                return self._cache
+            has_cache = self._cache is not None
+
+        # Пока другой поток обращается к листу, остальные не ждут его, а получают прежние ответы;
+        # ждут только вызовы без кэша и принудительное обновление, но не дольше REFRESH_WAIT
+        if has_cache and not force_refresh:
+            acquired = self._refresh_lock.acquire(blocking=False)
+        else:
+            acquired = self._refresh_lock.acquire(timeout=self.REFRESH_WAIT)
+        if not acquired:
+            logger.warning("Ответы уже загружаются в другом потоке")
+            return self._stale_records()
+
+        try:
+            with self._cache_lock:
+                # Пока ждали, кэш мог обновить другой поток
+                if self._cache is not None and not force_refresh and \
+                        time.monotonic() - self._cache_checked_at < self.CACHE_TTL:
+                    return self._cache
+                cached_version = self._cache_version if self._cache is not None and not force_refresh else None
+
+            with self._budget():
+                version = self._probe_version()
+                if version is not None and version == cached_version:
+                    with self._cache_lock:
+                        self._cache_checked_at = time.monotonic()
+                        return self._cache
+
+                # Версия отличается от закэшированной, даже если новых строк нет — значит, правили старые
+                changed = version is not None and cached_version is not None
+                clean_data = self._fetch_clean_data(full=force_refresh, changed=changed)
+            with self._cache_lock:
+                self._cache = clean_data
+                self._cache_version = version
+                self._cache_checked_at = time.monotonic()
+                return clean_data
+
+        except Exception as e:
+            logger.error(f"Ошибка загрузки данных: {str(e)}", exc_info=not isinstance(e, SheetsUnavailableError))
+            return self._stale_records()
+        finally:
+            self._refresh_lock.release()
+
+    def _stale_records(self) -> List[Dict[str, Any]]:
+        """Последние полученные ответы (кэш или локальная копия) без обращения к листу"""
+        with self._cache_lock:
+            stale = self._cache if self._cache is not None else self._records_from_store()
+            if stale:
+                logger.warning(f"Используются сохранённые ответы ({len(stale)} записей)")
+            return stale
+
+    def get_latest_responses(self, cached_only: bool = False) -> List[Dict[str, Any]]:
+        """
+        Возвращает по одной (самой свежей по "Отметка времени") записи на каждое ФИО.
+        Дубликаты отбрасываются в памяти за один проход, лист при этом не изменяется.
+        """
+        return [dict(record) for record in _latest_records(self._current_records(cached_only=cached_only))]
+
+    def get_latest_availability(self, cached_only: bool = False) -> List[Availability]:
+        """
+        Самые свежие ответы сотрудников, разобранные в Availability.
+        Разбор выполняется один раз на каждую загрузку ответов, затем возвращается готовый список.
+        """
+        records = self._current_records(cached_only=cached_only)
+        with self._cache_lock:
+            # Ключ — сам список записей: при каждом обновлении кэша он заменяется новым
+            if self._availability_source is records:
+                return list(self._availability)
+
+        availability = parse_responses(_latest_records(records))
+        with self._cache_lock:
+            if records is self._cache:
+                self._availability_source = records
+                self._availability = availability
+        return list(availability)
+
     def clear_responses(self) -> bool:
         """Очищает все данные в листе, кроме заголовков"""
-        if not self.sheet:
-            return False
-
         try:
-            # Получаем все данные
-            all_values = self.sheet.get_all_values()
+            with self._refresh_lock, self._budget():
+                # Получаем все данные
+                all_values = self._call(lambda sheet: sheet.get_all_values())
 
-            # Если есть только заголовок или вообще нет данных
-            if len(all_values) <= 1:
-                return True
+                # Если есть только заголовок или вообще нет данных
+                if len(all_values) <= 1:
+                    return True
 
-            # Определяем диапазон для очистки (со 2-й строки до последней)
-            range_to_clear = f"A2:Z{len(all_values)}"
+                # Определяем диапазон для очистки (со 2-й строки до последней)
+                range_to_clear = f"A2:Z{len(all_values)}"
 
-            # Очищаем данные
-            self.sheet.batch_clear([range_to_clear])
+                # Очищаем данные
+                self._call(lambda sheet: sheet.batch_clear([range_to_clear]))
+                self.invalidate_cache()
             logger.info(f"Очищено {len(all_values) - 1} строк")
             return True
 
@@ -110,49 +531,131 @@ class GoogleSheetsManager:
             logger.error(f"Ошибка при очистке листа: {e}")
             return False
 
-    def remove_duplicates(self) -> bool:
+    def deduplicate(self) -> Optional[Dict[str, Any]]:
         """
-        Удаляет дубликаты записей, оставляя только самые свежие данные для каждого сотрудника.
-        Возвращает True, если успешно, False в случае ошибки.
+        Оставляет по одной (самой свежей) записи на каждое ФИО.
+        Последняя запись определяется локально, а лист переписывается одним запросом:
+        оставшиеся строки сдвигаются вверх, хвост диапазона заполняется пустыми строками.
+        Строки, добавленные формой после чтения, не затрагиваются.
+        Возвращает отчёт {'kept': n, 'removed': [...]} или None в случае ошибки.
         """
-        if not self.sheet:
-            return False
+        import gspread.utils
 
         try:
-            # Получаем все данные (уже очищенные от пустых строк)
-            clean_data = self.get_clean_data()
-            if not clean_data:
-                return True  # Нет данных для обработки
-
-            # Сортируем записи по ФИО и времени (новые — в конец)
-            clean_data.sort(key=lambda x: (x["ФИО"], x["Отметка времени"]))
-
-            # Группируем по ФИО, сохраняя только последнюю запись
-            unique_data = {}
-            for record in clean_data:
-                unique_data[record["ФИО"]] = record  # Перезаписываем, остаётся последняя
-
-            # Преобразуем обратно в список
-            filtered_data = list(unique_data.values())
-
-            # Очищаем лист (кроме заголовков)
-            if not self.clear_responses():
-                return False
-
-            # Если данные остались — записываем обратно
-            if filtered_data:
-                # Подготавливаем данные для записи (в том же порядке, что и заголовки)
-                headers = self.sheet.row_values(1)  # Получаем заголовки
-                rows_to_write = [
-                    [record.get(header, "") for header in headers]
-                    for record in filtered_data
+            # Синхронизация не должна переписать локальную копию между чтением и записью листа
+            with self._refresh_lock, self._budget():
+                all_rows = self._call(lambda sheet: sheet.get_all_values())
+                report = {"kept": 0, "removed": []}
+                if len(all_rows) <= 1:
+                    return report
+
+                headers, data_rows = all_rows[0], all_rows[1:]
+                if "ФИО" not in headers:
+                    logger.error("Отсутствует обязательный столбец 'ФИО'")
+                    return None
+                fio_idx = headers.index("ФИО")
+                ts_idx = headers.index("Отметка времени") if "Отметка времени" in headers else None
+
+                # Для каждого ФИО запоминаем строку с наибольшей отметкой времени (при равенстве — более позднюю)
+                latest = {}
+                for i, row in enumerate(data_rows):
+                    if not any(cell.strip() for cell in row):
+                        continue
+                    key = (parse_timestamp(row[ts_idx]) if ts_idx is not None else datetime.min, i)
+                    fio = row[fio_idx]
+                    if fio not in latest or key >= latest[fio][0]:
+                        latest[fio] = (key, i)
+
+                keep = sorted(i for _, i in latest.values())
+                keep_set = set(keep)
+                report["kept"] = len(keep)
+                report["removed"] = [
+                    {"ФИО": row[fio_idx], "Отметка времени": row[ts_idx] if ts_idx is not None else ""}
+                    for i, row in enumerate(data_rows)
+                    if i not in keep_set and any(cell.strip() for cell in row)
                 ]
-                # Записываем, начиная со 2-й строки
-                self.sheet.insert_rows(rows_to_write, 2)
 
-            logger.info(f"Удалено {len(clean_data) - len(filtered_data)} дубликатов")
-            return True
+                if report["removed"]:
+                    width = len(headers)
+                    kept_rows = [data_rows[i] for i in keep]
+                    blank_rows = [[""] * width for _ in range(len(data_rows) - len(kept_rows))]
+                    last_cell = gspread.utils.rowcol_to_a1(len(all_rows), width)
+                    # Запись идемпотентна (фиксированный диапазон), поэтому её можно повторять.
+                    # RAW записывает значения как прочитаны: Sheets не переводит их в даты, числа и формулы
+                    self._call(lambda sheet: sheet.update(
+                        range_name=f"A2:{last_cell}",
+                        values=kept_rows + blank_rows,
+                        value_input_option="RAW"
+                    ))
+
+                    # Локальная копия уже совпадает с листом — достаточно сбросить кэш записей
+                    with self._cache_lock:
+                        self._store_headers = headers
+                        self._store_rows = kept_rows
+                        self._save_store()
+                        self._cache = None
+                        self._cache_version = None
+
+            logger.info(f"Удалено {len(report['removed'])} дубликатов: "
+                        f"{', '.join(r['ФИО'] for r in report['removed'])}")
+            return report
 
         except Exception as e:
             logger.error(f"Ошибка при удалении дубликатов: {e}", exc_info=True)
-            return False
\ No newline at end of file
+            return None
+
+    def remove_duplicates(self) -> bool:
+        """
+        Удаляет дубликаты записей, оставляя только самые свежие данные для каждого сотрудника.
+        Возвращает True, если успешно, False в случае ошибки.
+        """
+        return self.deduplicate() is not None
+
+
+class AsyncSheetsManager:
+    """
+    Асинхронный фасад над GoogleSheetsManager.
+    Блокирующие вызовы gspread выполняются в отдельном пуле потоков с таймаутом,
+    поэтому цикл событий бота продолжает обслуживать остальные чаты.
+    """
+    _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="sheets")
+
+    def __init__(self, manager: Optional[GoogleSheetsManager] = None, timeout: float = 30):
+        self.manager = manager or GoogleSheetsManager()
+        self.timeout = timeout
+
+    async def _run(self, func, default, *args, fallback: Callable[[], Any] = None, **kwargs):
+        """
+        Выполняет func в пуле потоков. По таймауту возвращает fallback() (сохранённые данные,
+        без обращения к листу), а если его нет — default.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs)),
+                self.timeout
+            )
+        except asyncio.TimeoutError:
+            logger.error(f"Превышено время ожидания Google Sheets ({self.timeout} с) в {func.__name__}")
+            return fallback() if fallback is not None else default
+
+    async def get_clean_data(self, force_refresh: bool = False) -> List[Dict[str, Any]]:
+        return await self._run(self.manager.get_clean_data, [], force_refresh=force_refresh,
+                               fallback=functools.partial(self.manager.get_clean_data, cached_only=True))
+
+    async def get_latest_responses(self) -> List[Dict[str, Any]]:
+        return await self._run(self.manager.get_latest_responses, [],
+                               fallback=functools.partial(self.manager.get_latest_responses, cached_only=True))
+
+    async def get_latest_availability(self) -> List[Availability]:
+        return await self._run(self.manager.get_latest_availability, [],
+                               fallback=functools.partial(self.manager.get_latest_availability, cached_only=True))
+
+    async def clear_responses(self) -> bool:
+        return await self._run(self.manager.clear_responses, False)
+
+    async def remove_duplicates(self) -> bool:
+        return await self._run(self.manager.remove_duplicates, False)
+
+    async def deduplicate(self) -> Optional[Dict[str, Any]]:
+        return await self._run(self.manager.deduplicate, None)
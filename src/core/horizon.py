@@ -0,0 +1,221 @@
+import hashlib
+import json
+import logging
+import os
+from datetime import date, timedelta
+from typing import Optional
+
+from src.core.availability import WEEKDAYS, parse_responses
+from src.core.backends import get_backend
+from src.core.scheduler import build_availability_matrix, generate_schedule
+from src.core.storage import load_shifts, update_schedule, load_schedule_week, save_schedule_week
+
+logger = logging.getLogger(__name__)
+
+# На сколько недель вперёд составляется расписание
+HORIZON_WEEKS = int(os.getenv("SCHEDULE_HORIZON_WEEKS", "4"))
+HORIZON_DOCUMENT = "schedule_horizon"
+
+
+def horizon_dates(start: date = None, weeks: int = None) -> list:
+    """Даты горизонта планирования: с понедельника недели start на weeks недель"""
+    start = start or date.today()
+    start -= timedelta(days=start.weekday())
+    return [start + timedelta(days=i) for i in range(7 * (weeks or HORIZON_WEEKS))]
+
+
+def load_horizon() -> dict:
+    """
+    Расписание по датам:
+    {"slots": {дата: слоты}, "dates": {дата: {"weekday", "slots", "signature", "staff"}}}.
+    Даты хранятся в ISO-формате; прошедшие даты остаются в документе как история.
+    """
+    horizon = get_backend().load_document(HORIZON_DOCUMENT) or {}
+    horizon.setdefault("slots", {})
+    horizon.setdefault("dates", {})
+    return horizon
+
+
+def set_date_slots(day: date, slots: int):
+    """Задаёт число слотов на конкретную дату вместо значения для дня недели"""
+    backend = get_backend()
+    with backend.transaction():
+        horizon = load_horizon()
+        horizon["slots"][day.isoformat()] = slots
+        backend.save_document(HORIZON_DOCUMENT, horizon)
+
+
+def date_slots(dates: list, weekly: dict = None, overrides: dict = None) -> dict:
+    """Число слотов на каждую дату: отдельно заданное или по дню недели"""
+    weekly = weekly if weekly is not None else load_shifts()
+    overrides = overrides or {}
+    return {
+        day.isoformat(): overrides.get(day.isoformat(), weekly.get(WEEKDAYS[day.weekday()], 0))
+        for day in dates
+    }
+
+
+def _signature(slots: int, names: list) -> str:
+    payload = json.dumps([slots, sorted(names)], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def regenerate_horizon(responses, start: date = None, weeks: int = None, engine: str = None) -> dict:
+    """
+    Пересчитывает расписание на горизонт планирования.
+    Пересчитываются только даты, у которых изменилось число слотов или список доступных сотрудников.
+    На таких датах сохраняются уже назначенные сотрудники, если они по-прежнему доступны,
+    а смены на остальных датах учитываются в нагрузке, чтобы распределение оставалось равномерным.
+    Возвращает {"schedule": {дата: сотрудники}, "changed": [даты], "unfilled": [(дата, не хватает)]}.
+    """
+    dates = horizon_dates(start, weeks)
+    responses = parse_responses(responses)
+    employees, available = build_availability_matrix(responses, WEEKDAYS)
+    available_by_weekday = [
+        [employees[i] for i in available[:, j].nonzero()[0]]
+        for j in range(len(WEEKDAYS))
+    ]
+
+    backend = get_backend()
+    with backend.transaction():
+        horizon = load_horizon()
+        slots = date_slots(dates, overrides=horizon["slots"])
+        entries = horizon["dates"]
+
+        changed, fixed, base_counts, day_names = {}, {}, {}, {}
+        for day in dates:
+            key = day.isoformat()
+            weekday = WEEKDAYS[day.weekday()]
+            names = available_by_weekday[day.weekday()]
+            signature = _signature(slots[key], names)
+            entry = entries.get(key)
+
+            if entry and entry.get("signature") == signature:
+                for name in entry["staff"]:
+                    base_counts[name] = base_counts.get(name, 0) + 1
+                continue
+
+            changed[key] = slots[key]
+            day_names[key] = weekday
+            entries[key] = {"weekday": weekday, "slots": slots[key], "signature": signature, "staff": []}
+            if entry:
+                still_available = set(names)
+                fixed[key] = [name for name in entry["staff"] if name in still_available]
+
+        if changed:
+            schedule, _ = generate_schedule(
+                responses, changed, engine=engine,
+                day_names=day_names, base_counts=base_counts, fixed=fixed
+            )
+            for key in changed:
+                entries[key]["staff"] = schedule[key]
+            backend.save_document(HORIZON_DOCUMENT, horizon)
+
+    unfilled = [
+        (key, slots[key] - len(entries[key]["staff"]))
+        for key in slots if len(entries[key]["staff"]) < slots[key]
+    ]
+    logger.info(f"Горизонт {dates[0]} — {dates[-1]}: пересчитано дат {len(changed)} из {len(dates)}")
+    return {
+        "schedule": {day.isoformat(): entries[day.isoformat()]["staff"] for day in dates},
+        "changed": list(changed),
+        "unfilled": unfilled,
+    }
+
+
+def upcoming_week_start(today: date = None) -> date:
+    """Понедельник следующей недели: рассылка в конце недели публикует расписание на неё"""
+    today = today or date.today()
+    return today + timedelta(days=7 - today.weekday())
+
+
+def week_schedule(schedule: dict, week_start: date = None) -> dict:
+    """Расписание одной недели из горизонта в формате {день недели: сотрудники}"""
+    week_start = horizon_dates(week_start, 1)[0]
+    return {
+        WEEKDAYS[i]: list(schedule.get((week_start + timedelta(days=i)).isoformat(), []))
+        for i in range(7)
+    }
+
+
+def update_current_week(result: dict, week_start: date):
+    """
+    Переносит неделю week_start из результата regenerate_horizon в текущее расписание (current_schedule).
+    Если текущее расписание относится к этой же неделе, перезаписываются только пересчитанные даты
+    и дни, которых в нём ещё нет, поэтому обмены и ручные правки на остальных днях сохраняются.
+    Если к другой (наступила новая неделя), оно целиком собирается из горизонта.
+    Возвращает (расписание недели, [(день недели, не хватает)]) как generate_schedule.
+    """
+    dates = horizon_dates(week_start, 1)
+    week_start = dates[0]
+    changed = set(result["changed"])
+    week = {}
+
+    def mutate(schedule):
+        nonlocal week
+        # Сотрудники берутся из документа, а не из result: между пересчётом и этой записью мог пройти обмен
+        staff_by_date = {key: entry["staff"] for key, entry in load_horizon()["dates"].items()}
+        if load_schedule_week() != week_start:
+            schedule.clear()
+            schedule.update(week_schedule(staff_by_date, week_start))
+            # Неделя сохраняется в той же транзакции до save_schedule: по ней store_week выбирает даты
+            save_schedule_week(week_start)
+            week = schedule
+            return True
+
+        updated = False
+        for day in dates:
+            key, weekday = day.isoformat(), WEEKDAYS[day.weekday()]
+            if key in changed or weekday not in schedule:
+                staff = list(staff_by_date.get(key, []))
+                if schedule.get(weekday) != staff:
+                    schedule[weekday] = staff
+                    updated = True
+        week = schedule
+        return updated
+
+    update_schedule(mutate)
+    week_keys = {day.isoformat() for day in dates}
+    unfilled = [
+        (WEEKDAYS[date.fromisoformat(key).weekday()], count)
+        for key, count in result["unfilled"] if key in week_keys
+    ]
+    return week, unfilled
+
+
+def publish_upcoming_week(responses, today: date = None, engine: str = None):
+    """
+    Пересчитывает горизонт, начиная со следующей недели, и делает её текущим расписанием.
+    Возвращает (результат regenerate_horizon, расписание недели, [(день недели, не хватает)]).
+    Выполняется долго (генерация по всем датам горизонта), поэтому из бота вызывается в пуле потоков.
+    """
+    week_start = upcoming_week_start(today)
+    result = regenerate_horizon(responses, start=week_start, engine=engine)
+    schedule, unfilled = update_current_week(result, week_start)
+    return result, schedule, unfilled
+
+
+def store_week(schedule: dict, week_start: Optional[date]):
+    """
+    Записывает недельное расписание {день недели: сотрудники} в даты горизонта недели week_start,
+    чтобы обмены и ручные правки не терялись при следующем пересчёте.
+    Если неделя неизвестна (расписание сохранено до появления горизонта), ничего не записывается;
+    даты, которых в горизонте нет, пропускаются.
+    """
+    if week_start is None:
+        return
+    backend = get_backend()
+    with backend.transaction():
+        horizon = backend.load_document(HORIZON_DOCUMENT)
+        if not horizon:
+            return
+        entries = horizon.get("dates", {})
+        updated = False
+        for day in horizon_dates(week_start, 1):
+            entry = entries.get(day.isoformat())
+            staff = schedule.get(WEEKDAYS[day.weekday()])
+            if entry is not None and staff is not None and entry["staff"] != staff:
+                entry["staff"] = list(staff)
+                updated = True
+        if updated:
+            backend.save_document(HORIZON_DOCUMENT, horizon)
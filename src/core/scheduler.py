@@ -1,70 +1,231 @@
 from collections import defaultdict
-import pandas as pd
+import os
+import numpy as np
 import logging
 
+from src.core.availability import DAY_BITS, days_mask, parse_responses
+
 # Настройка логгера
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Алгоритм по умолчанию: "greedy" (жадный проход по дням) или "flow" (оптимальное распределение)
+SCHEDULE_ENGINE = os.getenv("SCHEDULE_ENGINE", "greedy")
+
+
+def _mask_matrix(masks: list, days: list) -> np.ndarray:
+    """Булева матрица (сотрудники x дни) из битовых масок дней недели"""
+    bits = np.array([DAY_BITS.get(day, 0) for day in days], dtype=np.int64)
+    return (np.asarray(masks, dtype=np.int64).reshape(-1, 1) & bits.reshape(1, -1)) != 0
+
 
-def generate_schedule(df: pd.DataFrame, shifts_per_day: dict):
-    """Генерирует расписание смен"""
+def build_availability_matrix(responses, days: list):
+    """
+    Строит булеву матрицу доступности (сотрудники x дни) из разобранных ответов.
+    Одно название дня может встречаться в days несколько раз (например, несколько понедельников).
+    Возвращает (список сотрудников, матрица).
+    """
+    records = parse_responses(responses)
+    return [record.fio for record in records], _mask_matrix([record.days for record in records], days)
+
+
+def generate_schedule(responses, shifts_per_day: dict, engine: str = None, max_shifts: int = None,
+                      day_names: dict = None, base_counts: dict = None, fixed: dict = None):
+    """
+    Генерирует расписание смен.
+    responses — список Availability (или записи формы / DataFrame, они разбираются на месте).
+    day_names сопоставляет ключу дня название дня недели из формы (по умолчанию ключ и есть название),
+    base_counts — смены сотрудников, уже назначенные вне этого расчёта,
+    fixed — назначения, которые нужно сохранить как есть (они занимают слоты своего дня).
+    """
     # Проверка входных данных
-    if df.empty or "ФИО" not in df.columns or "Дни" not in df.columns:
+    if hasattr(responses, "columns") and ("ФИО" not in responses.columns or "Дни" not in responses.columns):
+        raise ValueError("Некорректные входные данные")
+    records = parse_responses(responses)
+    if not records:
         raise ValueError("Некорректные входные данные")
 
-    employees = df["ФИО"].tolist()
-    availability = {row["ФИО"]: row["Дни"] for _, row in df.iterrows()}
-
-    total_shifts = sum(shifts_per_day.values())
-    average_shifts = total_shifts // len(employees) if employees else 0
+    engine = engine or SCHEDULE_ENGINE
+    if engine not in ("greedy", "flow"):
+        raise ValueError(f"Неизвестный алгоритм составления расписания: {engine}")
+
+    days = [day for day in shifts_per_day if day]  # Пропускаем пустые дни
+    day_names = day_names or {}
+    weekdays = [day_names.get(day, day) for day in days]
+    employees = [record.fio for record in records]
+    available = _mask_matrix([record.days for record in records], weekdays)
+    preferred = _mask_matrix([record.preferred for record in records], weekdays)
+    index = {name: i for i, name in enumerate(employees)}
+
+    base = np.zeros(len(employees), dtype=np.int64)
+    for name, count in (base_counts or {}).items():
+        if name in index:
+            base[index[name]] += count
+    total_shifts = sum(shifts_per_day.values()) + int(base.sum())
+
+    # Закреплённые назначения занимают слоты и учитываются в нагрузке
+    required = np.array([max(shifts_per_day[day], 0) for day in days], dtype=np.int64)
+    pinned_count = np.zeros(len(employees), dtype=np.int64)
+    pinned = {}
+    for j, day in enumerate(days):
+        keep = list(dict.fromkeys((fixed or {}).get(day, [])))[:required[j]]
+        rows = [index[name] for name in keep if name in index]
+        available[rows, j] = False
+        pinned_count[rows] += 1
+        required[j] -= len(keep)
+        pinned[day] = keep
+
+    if engine == "flow":
+        capacity = max_shifts if max_shifts is not None else len(days)
+        assigned = _assign_flow(available, required, base + pinned_count, capacity - pinned_count)
+    else:
+        assigned = _assign_greedy(available, preferred, required, base + pinned_count, total_shifts)
 
     schedule = defaultdict(list)
-    shifts_count = {name: 0 for name in employees}
+    for j, day in enumerate(days):
+        schedule[day] = pinned[day] + [employees[i] for i in assigned[j]]
 
-    # Первичное распределение
-    for day, required in shifts_per_day.items():
-        if not day:  # Пропускаем пустые дни
-            continue
+    return schedule, _unfilled_days(schedule, shifts_per_day)
+
+
+def _assign_greedy(available: np.ndarray, preferred: np.ndarray, required: np.ndarray, counts: np.ndarray,
+                   total_shifts: int) -> list:
+    """
+    Жадный проход по дням: сначала сотрудники с нагрузкой ниже средней, затем остальные.
+    При равной нагрузке первыми идут те, кто отметил день как предпочтительный.
+    """
+    shifts_count = counts.copy()
+    average_shifts = total_shifts // len(shifts_count) if len(shifts_count) else 0
+
+    assigned_by_day = []
+    for j in range(available.shape[1]):
+        available_today = np.flatnonzero(available[:, j])
+        below_average = available_today[shifts_count[available_today] < average_shifts]
+        below_average = below_average[np.lexsort((~preferred[below_average, j], shifts_count[below_average]))]
+        assigned = below_average[:required[j]]
 
-        available_today = [emp for emp in employees if day in availability.get(emp, [])]
-        preferred = [emp for emp in available_today if shifts_count[emp] < average_shifts]
-        preferred.sort(key=lambda name: shifts_count[name])
-        assigned = preferred[:required]
+        if len(assigned) < required[j]:
+            remaining_needed = required[j] - len(assigned)
+            others = available_today[~np.isin(available_today, assigned)]
+            others = others[np.lexsort((~preferred[others, j], shifts_count[others]))]
+            assigned = np.concatenate([assigned, others[:remaining_needed]])
 
-        if len(assigned) < required:
-            remaining_needed = required - len(assigned)
-            others = [emp for emp in available_today if emp not in assigned]
-            others.sort(key=lambda name: shifts_count[name])
-            assigned += others[:remaining_needed]
+        assigned_by_day.append(assigned.tolist())
+        shifts_count[assigned] += 1
 
-        schedule[day] = assigned
-        for name in assigned:
-            shifts_count[name] += 1
+    return assigned_by_day
 
-    # Финальная проверка незаполненных смен
+
+def _unfilled_days(schedule: dict, shifts_per_day: dict) -> list:
+    """Финальная проверка незаполненных смен"""
     unfilled_days = []
     for day, required in shifts_per_day.items():
         if day:  # Проверяем только непустые дни
             current_shifts = len(schedule.get(day, []))
             if current_shifts < required:
                 unfilled_days.append((day, required - current_shifts))  # Исправленная строка
+    return unfilled_days
+
+
+def _assign_flow(available: np.ndarray, required: np.ndarray, counts: np.ndarray, capacity) -> list:
+    """
+    Оптимальное распределение смен как задача min-cost max-flow:
+    источник -> сотрудник -> день -> сток, где k-я смена сотрудника стоит 2k-1.
+    Такая стоимость минимизирует сумму квадратов нагрузок, то есть разброс числа смен,
+    при максимально возможном числе закрытых слотов.
+
+    Все стоимости сосредоточены на рёбрах источника, поэтому кратчайший увеличивающий путь
+    всегда начинается у наименее загруженного сотрудника, который ещё может получить смену
+    (возможно, через цепочку передачи смен между коллегами). Сотрудник, для которого такой
+    путь не нашёлся, не сможет получить смену и позже, поэтому исключается из перебора.
+    """
+    n_employees, n_days = available.shape
+    required = required.tolist()
+    can_work = [np.flatnonzero(row).tolist() for row in available]
+    capacity = np.broadcast_to(capacity, n_employees).tolist()
+
+    load = counts.tolist()
+    added = [0] * n_employees
+    fill = [0] * n_days
+    assigned = [set() for _ in range(n_employees)]  # Дни каждого сотрудника
+    day_staff = [set() for _ in range(n_days)]  # Сотрудники на каждый день
+
+    def augment(start: int) -> bool:
+        """Ищет чередующийся путь от сотрудника до дня со свободным слотом и проводит по нему смену"""
+        parent = {}
+        visited_staff = {start}
+        visited_days = set()
+        stack = [start]
+        while stack:
+            u = stack.pop()
+            for j in can_work[u]:
+                if j in assigned[u] or j in visited_days:
+                    continue
+                visited_days.add(j)
+
+                if fill[j] < required[j]:
+                    # Свободный слот найден: сдвигаем смены вдоль пути
+                    fill[j] += 1
+                    v, day_idx = u, j
+                    while True:
+                        assigned[v].add(day_idx)
+                        day_staff[day_idx].add(v)
+                        if v == start:
+                            break
+                        prev, prev_day = parent[v]
+                        assigned[v].discard(prev_day)
+                        day_staff[prev_day].discard(v)
+                        v, day_idx = prev, prev_day
+                    load[start] += 1
+                    added[start] += 1
+                    return True
+
+                # День занят: пробуем передать смену одного из работающих в этот день
+                for w in day_staff[j]:
+                    if w not in visited_staff:
+                        visited_staff.add(w)
+                        parent[w] = (u, j)
+                        stack.append(w)
+        return False
+
+    total_required = sum(required)
+    exhausted = set()
+    while sum(fill) < total_required:
+        active = [e for e in range(n_employees) if e not in exhausted and added[e] < capacity[e] and can_work[e]]
+        if not active:
+            break
+        level = min(load[e] for e in active)
+        for e in active:
+            if load[e] == level and not augment(e):
+                exhausted.add(e)
+
+    logger.info(f"Распределено {sum(fill)} из {total_required} смен (алгоритм flow)")
+    return [sorted(staff) for staff in day_staff]
+
+
+def build_schedule_table(schedule: dict, employee_names: list, availability: dict = None, as_array: bool = False):
+    """
+    Строит таблицу расписания: ✅ — смена назначена, ❌ — сотрудник отмечал этот день, иначе пусто.
+    availability сопоставляет ФИО ответ из столбца "Дни" или разобранный Availability.
+    С as_array=True возвращает (массив ячеек, подписи строк, подписи столбцов) без создания DataFrame.
+    """
+    days = list(schedule.keys())
+    names = list(employee_names)
+    rows_by_name = defaultdict(list)
+    for i, name in enumerate(names):
+        rows_by_name[name].append(i)
 
-    return schedule, unfilled_days
+    working = np.zeros((len(names), len(days)), dtype=bool)
+    for j, day in enumerate(days):
+        for name in set(schedule[day]):
+            working[rows_by_name.get(name, []), j] = True
 
+    availability = availability or {}
+    can_work = _mask_matrix([days_mask(availability.get(name)) for name in names], days)
 
-def build_schedule_table(schedule: dict, employee_names: list, availability: dict = None) -> pd.DataFrame:
-    """Строит таблицу расписания"""
-    days = list(schedule.keys())
-    table = pd.DataFrame(index=employee_names, columns=days)
-
-    for day in days:
-        for name in employee_names:
-            if name in schedule[day]:
-                table.at[name, day] = "✅"
-            elif availability and day in availability.get(name, []):
-                table.at[name, day] = "❌"
-            else:
-                table.at[name, day] = ""
-
-    return table.fillna("")
\ No newline at end of file
+    cells = np.where(working, "✅", np.where(can_work, "❌", "")).astype(object)
+    if as_array:
+        return cells, names, days
+
+    import pandas as pd
+    return pd.DataFrame(cells, index=names, columns=days)
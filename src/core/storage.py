@@ -1,6 +1,13 @@
 import json
+import logging
 import os
-from pathlib import Path
+from datetime import date
+
+from src.core.backends import get_backend
+from src.core.exchange_offers import get_exchange_store
+from src.utils.render_cache import render_cache
+
+logger = logging.getLogger(__name__)
 
 DEFAULT_SHIFTS = {
     "Понедельник": 0,
@@ -16,14 +23,20 @@ def reset_shifts():
     save_shifts(DEFAULT_SHIFTS.copy())
 
 def load_shifts():
-    if os.path.exists("../../data/shifts.json"):
-        with open("../../data/shifts.json", "r", encoding="utf-8") as f:
-            return json.load(f)
-    return DEFAULT_SHIFTS.copy()
+    shifts = get_backend().load_shifts()
+    return shifts if shifts is not None else DEFAULT_SHIFTS.copy()
 
 def save_shifts(shifts):
-    with open("../../data/shifts.json", "w", encoding="utf-8") as f:
-        json.dump(shifts, f, ensure_ascii=False, indent=2)
+    get_backend().save_shifts(shifts)
+
+def update_shifts(day, delta):
+    """Атомарно изменяет число слотов на день и возвращает новое значение"""
+    backend = get_backend()
+    with backend.transaction():
+        shifts = load_shifts()
+        shifts[day] = shifts.get(day, 0) + delta
+        backend.save_shifts(shifts)
+        return shifts[day]
 
 def load_admins():
     if os.path.exists("../../data/admins.json"):
@@ -42,94 +55,95 @@ def save_notification_time(hours, minutes, day):
     with open("../../config/notification_time.json", "w") as f:
         json.dump({'hours': hours, 'minutes': minutes, 'day': day}, f)
 
+# Версия текущего расписания в этом процессе: увеличивается при каждом save_schedule
+_schedule_version = 0
+
+def schedule_version():
+    """Версия текущего расписания для ключей кэша; дешевле, чем хэшировать само расписание"""
+    return _schedule_version
+
 def save_schedule(schedule):
-    """Сохраняет текущее расписание в файл"""
-    with open("../../data/current_schedule.json", "w", encoding="utf-8") as f:
-        json.dump(schedule, f, ensure_ascii=False, indent=2)
+    """
+    Сохраняет текущее расписание и сбрасывает кэш изображений.
+    Те же дни записываются в расписание на горизонт, чтобы пересчёт горизонта не отменил обмены.
+    """
+    from src.core.horizon import store_week  # horizon сам импортирует storage
+    global _schedule_version
+
+    backend = get_backend()
+    with backend.transaction():
+        backend.save_document("current_schedule", schedule)
+        backend.save_document("current_schedule_photo", None)
+        store_week(schedule, load_schedule_week())
+        _schedule_version += 1
+    render_cache.clear()
+    get_exchange_store().supersede_stale(schedule)
+
+def update_schedule(mutate):
+    """
+    Выполняет чтение-изменение-запись расписания в одной транзакции.
+    mutate(schedule) изменяет расписание на месте и возвращает результат;
+    расписание сохраняется, только если результат истинный.
+    """
+    backend = get_backend()
+    with backend.transaction():
+        schedule = load_schedule()
+        result = mutate(schedule)
+        if result:
+            save_schedule(schedule)
+        return result
+
+def save_schedule_file_ids(render_key, file_ids):
+    """Запоминает file_id загруженных в Telegram страниц изображения текущего расписания"""
+    get_backend().save_document("current_schedule_photo", {'render_key': render_key, 'file_ids': list(file_ids)})
+
+def load_schedule_file_ids(render_key):
+    """Возвращает file_id страниц, если они построены для того же содержимого"""
+    data = get_backend().load_document("current_schedule_photo")
+    if data and data.get('render_key') == render_key:
+        if 'file_ids' in data:
+            return data['file_ids']
+        if data.get('file_id'):
+            return [data['file_id']]
+    return None
 
 def load_schedule():
-    """Загружает текущее расписание из файла"""
-    if os.path.exists("../../data/current_schedule.json"):
-        with open("../../data/current_schedule.json", "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
+    """Загружает текущее расписание"""
+    return get_backend().load_document("current_schedule") or {}
 
-def get_exchange_offers_file():
-    """Возвращает путь к файлу с предложениями обмена"""
-    return Path(__file__).parent.parent.parent / "data" / "exchange_offers.json"
+def load_schedule_week():
+    """Понедельник недели, к которой относится текущее расписание (None, если неизвестен)"""
+    week_start = get_backend().load_document("current_schedule_week")
+    return date.fromisoformat(week_start) if week_start else None
 
-def save_exchange_offer(offer):
-    """Сохраняет предложение обмена в файл"""
-    print(f"Пытаюсь сохранить предложение: {offer}")
-    file_path = get_exchange_offers_file()
-    file_path.parent.mkdir(parents=True, exist_ok=True)
+def save_schedule_week(week_start):
+    """Запоминает неделю текущего расписания; вызывается вместе с его сохранением"""
+    get_backend().save_document("current_schedule_week", week_start.isoformat())
 
+def save_exchange_offer(offer):
+    """Сохраняет предложение обмена и возвращает его (с присвоенным id) или None при ошибке"""
     try:
-        # Загружаем существующие предложения
-        if file_path.exists():
-            with open(file_path, "r", encoding="utf-8") as f:
-                offers = json.load(f)
-        else:
-            offers = []
-
-        # Добавляем новое предложение
-        offers.append(offer)
-
-        # Сохраняем обратно
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(offers, f, indent=2, ensure_ascii=False)
-
-        return True
+        return get_exchange_store().add(offer)
     except Exception as e:
-        print(f"Ошибка при сохранении предложения обмена: {e}")
-        return False
-
-def find_exchange_offer(from_user_id, to_user_id):
-    """Находит предложение обмена по ID пользователей"""
-    file_path = get_exchange_offers_file()
-
-    if not file_path.exists():
+        logger.error(f"Ошибка при сохранении предложения обмена: {e}")
         return None
 
+def find_exchange_offer(from_user_id, to_user_id):
+    """Находит ожидающее предложение обмена по ID пользователей"""
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            offers = json.load(f)
-
-        for offer in offers:
-            if (offer.get('from_user') == from_user_id and
-                    offer.get('to_user') == to_user_id and
-                    offer.get('status') == 'pending'):
-                return offer
-
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        print(f"Ошибка при поиске предложения обмена: {e}")
-
-    return None
+        return get_exchange_store().find_pending(from_user_id, to_user_id)
+    except Exception as e:
+        logger.error(f"Ошибка при поиске предложения обмена: {e}")
+        return None
 
 def remove_exchange_offer(offer_to_remove):
     """Удаляет предложение обмена"""
-    file_path = get_exchange_offers_file()
-
-    if not file_path.exists():
-        return False
-
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            offers = json.load(f)
-
-        # Удаляем предложение (сравниваем по всем полям)
-        new_offers = [
-            o for o in offers
-            if not (o.get('from_user') == offer_to_remove.get('from_user') and
-                    o.get('to_user') == offer_to_remove.get('to_user') and
-                    o.get('day_to_give') == offer_to_remove.get('day_to_give') and
-                    o.get('day_to_get') == offer_to_remove.get('day_to_get'))
-        ]
-
-        with open(file_path, "w", encoding="utf-8") as f: \
-            json.dump(new_offers, f, indent=2, ensure_ascii=False)
-
-        return True
+        return get_exchange_store().remove(offer_to_remove)
     except Exception as e:
-        print(f"Ошибка при удалении предложения обмена: {e}")
-        return False
\ No newline at end of file
+        logger.error(f"Ошибка при удалении предложения обмена: {e}")
+        return False
+
+def compact_exchange_offers():
+    """Удаляет просроченные и закрытые предложения обмена"""
+    return get_exchange_store().compact()
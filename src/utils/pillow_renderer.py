@@ -0,0 +1,170 @@
+import importlib.util
+import os
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFont
+
+# Шрифты в порядке предпочтения; первый найденный используется для всех надписей
+FONT_CANDIDATES = [
+    os.getenv("SCHEDULE_FONT"),
+    "C:/Windows/Fonts/arial.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "/Library/Fonts/Arial.ttf",
+]
+
+FONT_SIZE_PT = 10
+WORKING_FILL = "#c8e6c9"
+AVAILABLE_FILL = "#ffcdd2"
+CHECK_COLOR = "#43a047"
+CROSS_COLOR = "#e53935"
+FIGURE_WIDTH_IN = 12
+# Telegram уменьшает фотографии до 2560 пикселей по большей стороне, рисовать крупнее нет смысла
+MAX_WIDTH_PX = 2560
+
+# Изображение рисуется сразу в палитре: PNG с палитрой кодируется в несколько раз быстрее RGB.
+# Индексы 0..TEXT_LEVELS-1 — оттенки серого от чёрного до белого для сглаженного текста и сетки,
+# после них — цвета ячеек и отметок
+TEXT_LEVELS = 16
+BLACK = 0
+WHITE = TEXT_LEVELS - 1
+WORKING, AVAILABLE, CHECK, CROSS = range(TEXT_LEVELS, TEXT_LEVELS + 4)
+
+
+def _rgb(color: str) -> list:
+    return [int(color[i:i + 2], 16) for i in (1, 3, 5)]
+
+
+PALETTE = (
+    [round(255 * i / (TEXT_LEVELS - 1)) for i in range(TEXT_LEVELS) for _ in range(3)]
+    + _rgb(WORKING_FILL) + _rgb(AVAILABLE_FILL) + _rgb(CHECK_COLOR) + _rgb(CROSS_COLOR)
+)
+# Покрытие глифа (0..255) в индекс оттенка серого: чёрный текст на белом фоне
+TEXT_LUT = [round((255 - coverage) * (TEXT_LEVELS - 1) / 255) for coverage in range(256)]
+
+
+def _matplotlib_font():
+    """DejaVuSans из поставки matplotlib, без импорта самого matplotlib"""
+    spec = importlib.util.find_spec("matplotlib")
+    if spec is None or not spec.submodule_search_locations:
+        return None
+    return os.path.join(spec.submodule_search_locations[0], "mpl-data", "fonts", "ttf", "DejaVuSans.ttf")
+
+
+@lru_cache(maxsize=None)
+def load_font(size: int):
+    """Загружает шрифт один раз на процесс для каждого размера"""
+    for path in FONT_CANDIDATES + [_matplotlib_font()]:
+        if path and os.path.exists(path):
+            try:
+                return ImageFont.truetype(path, size)
+            except OSError:
+                continue
+    return ImageFont.load_default(size=size)
+
+
+def _draw_check(draw: ImageDraw.ImageDraw, cx: float, cy: float, size: float):
+    """Зелёный квадрат с белой галочкой, как у эмодзи ✅"""
+    half = size / 2
+    draw.rounded_rectangle((cx - half, cy - half, cx + half, cy + half), radius=size / 5, fill=CHECK)
+    draw.line(
+        [(cx - size * 0.28, cy + size * 0.02), (cx - size * 0.08, cy + size * 0.22), (cx + size * 0.28, cy - size * 0.2)],
+        fill=WHITE, width=max(1, round(size / 8)), joint="curve"
+    )
+
+
+def _draw_cross(draw: ImageDraw.ImageDraw, cx: float, cy: float, size: float):
+    """Красный крест, как у эмодзи ❌"""
+    half = size * 0.4
+    width = max(1, round(size / 6))
+    draw.line([(cx - half, cy - half), (cx + half, cy + half)], fill=CROSS, width=width)
+    draw.line([(cx - half, cy + half), (cx + half, cy - half)], fill=CROSS, width=width)
+
+
+@lru_cache(maxsize=64)
+def _cell_sprite(value: str, width: int, height: int) -> Image.Image:
+    """Готовая ячейка с заливкой и отметкой; на странице одинаковые ячейки только копируются"""
+    cell = Image.new("L", (width, height), WORKING if value == "✅" else AVAILABLE)
+    draw = ImageDraw.Draw(cell)
+    if value == "✅":
+        _draw_check(draw, width / 2, height / 2, height * 0.55)
+    else:
+        _draw_cross(draw, width / 2, height / 2, height * 0.55)
+    return cell
+
+
+@lru_cache(maxsize=4096)
+def _text_sprite(text: str, size: int):
+    """
+    Надпись в индексах палитры и смещение её левого верхнего угла от точки привязки (слева, по центру).
+    ФИО и дни повторяются от страницы к странице, поэтому надписи рисуются один раз на процесс.
+    """
+    font = load_font(size)
+    left, top, right, bottom = font.getbbox(text, anchor="lm")
+    mask = Image.new("L", (max(1, right - left), max(1, bottom - top)), 0)
+    ImageDraw.Draw(mask).text((-left, -top), text, font=font, fill=255, anchor="lm")
+    return mask.point(TEXT_LUT), left, top
+
+
+def render_schedule_image(cells, row_labels: list, col_labels: list, output, dpi: int = 300):
+    """
+    Рисует таблицу расписания напрямую в растр, без matplotlib.
+    cells — массив значений ("✅", "❌" или ""), output — имя файла или файловый объект.
+    """
+    dpi = min(dpi, MAX_WIDTH_PX / FIGURE_WIDTH_IN)
+    scale = dpi / 72
+    font_size = round(FONT_SIZE_PT * scale)
+    font = load_font(font_size)
+    pad = round(4 * scale)
+    line = max(1, round(scale / 2))
+    row_height = round(FONT_SIZE_PT * scale * 2)
+    margin = round(0.2 * dpi)
+
+    # Геометрия сетки считается один раз: ширина колонки имён по самому длинному ФИО,
+    # остальная ширина делится поровну между днями
+    label_width = max([font.getlength(str(label)) for label in row_labels] + [0]) + 2 * pad
+    header_width = max([font.getlength(str(label)) for label in col_labels] + [0]) + 2 * pad
+    table_width = FIGURE_WIDTH_IN * dpi - 2 * margin
+    day_width = max(header_width, (table_width - label_width) / max(len(col_labels), 1))
+    table_width = label_width + day_width * len(col_labels)
+
+    width = round(table_width + 2 * margin)
+    height = round(row_height * (len(row_labels) + 1) + 2 * margin)
+    # Пока рисуется, изображение в режиме L хранит индексы палитры; putpalette в конце делает его P
+    image = Image.new("L", (width, height), WHITE)
+    draw = ImageDraw.Draw(image)
+
+    left, top = margin, margin
+    xs = [round(left + label_width + day_width * j) for j in range(len(col_labels) + 1)]
+
+    # Заливка и отметки
+    for i, row in enumerate(cells):
+        y0 = top + row_height * (i + 1)
+        for j, value in enumerate(row):
+            if value == "✅" or value == "❌":
+                image.paste(_cell_sprite(value, xs[j + 1] - xs[j], row_height), (xs[j], y0))
+
+    # Подписи
+    def put_text(text: str, x: float, cy: float):
+        sprite, dx, dy = _text_sprite(text, font_size)
+        image.paste(sprite, (round(x) + dx, round(cy) + dy))
+
+    for j, label in enumerate(col_labels):
+        label = str(label)
+        put_text(label, (xs[j] + xs[j + 1] - font.getlength(label)) / 2, top + row_height / 2)
+    for i, label in enumerate(row_labels):
+        put_text(str(label), left + pad, top + row_height * (i + 1.5))
+
+    # Сетка (левый верхний угол пустой, как в таблице matplotlib)
+    bottom = top + row_height * (len(row_labels) + 1)
+    right = xs[-1]
+    draw.line([(xs[0], top), (right, top)], fill=BLACK, width=line)
+    for i in range(1, len(row_labels) + 2):
+        y = top + row_height * i
+        draw.line([(left, y), (right, y)], fill=BLACK, width=line)
+    draw.line([(left, top + row_height), (left, bottom)], fill=BLACK, width=line)
+    for x in xs:
+        draw.line([(x, top), (x, bottom)], fill=BLACK, width=line)
+
+    image.putpalette(PALETTE)
+    image.save(output, format="PNG", compress_level=1)
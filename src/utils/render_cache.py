@@ -0,0 +1,111 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = Path(__file__).parent.parent.parent / "data" / "render_cache"
+
+
+def make_render_key(schedule: dict, availability: dict = None, options: dict = None) -> str:
+    """Считает ключ кэша по содержимому расписания, доступности и параметрам отрисовки"""
+    payload = json.dumps(
+        {
+            "schedule": schedule or {},
+            "availability": availability or {},
+            "options": options or {},
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """
+    LRU-кэш готовых PNG с расписанием.
+    Хранит байты в памяти и, если указан каталог, дублирует их на диск.
+    """
+
+    def __init__(self, max_items: int = 16, cache_dir: Optional[Path] = DEFAULT_CACHE_DIR):
+        self.max_items = max_items
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+                return data
+
+        data = self._read_disk(key)
+        if data is not None:
+            self._remember(key, data)
+        return data
+
+    def put(self, key: str, data: bytes):
+        self._remember(key, data)
+        self._write_disk(key, data)
+
+    def clear(self):
+        """Сбрасывает кэш (вызывается при сохранении нового расписания)"""
+        with self._lock:
+            self._items.clear()
+
+        if self.cache_dir and self.cache_dir.exists():
+            for path in self.cache_dir.glob("*.png"):
+                try:
+                    path.unlink()
+                except OSError as e:
+                    logger.warning(f"Не удалось удалить {path}: {e}")
+
+    def _remember(self, key: str, data: bytes):
+        with self._lock:
+            self._items[key] = data
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                evicted, _ = self._items.popitem(last=False)
+                self._remove_disk(evicted)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.png"
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        if not self.cache_dir:
+            return None
+        try:
+            return self._path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Ошибка чтения кэша изображения: {e}")
+            return None
+
+    def _write_disk(self, key: str, data: bytes):
+        if not self.cache_dir:
+            return
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._path(key).write_bytes(data)
+        except OSError as e:
+            logger.warning(f"Ошибка записи кэша изображения: {e}")
+
+    def _remove_disk(self, key: str):
+        if not self.cache_dir:
+            return
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Ошибка удаления кэша изображения: {e}")
+
+
+render_cache = RenderCache()
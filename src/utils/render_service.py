@@ -0,0 +1,126 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+# Число процессов отрисовки; 0 — рисовать в одном отдельном потоке основного процесса
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(os.cpu_count() or 1)))
+# Сколько отрисовок может одновременно ждать в очереди пула
+RENDER_QUEUE_DEPTH = int(os.getenv("RENDER_QUEUE_DEPTH", str(max(RENDER_WORKERS, 1) * 2)))
+RENDER_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", "60"))
+
+
+def _warm_up():
+    """Инициализация процесса отрисовки: backend и шрифты загружаются один раз"""
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.figure  # noqa: F401
+        from src.utils.utils import load_fonts
+        from src.utils.pillow_renderer import load_font
+        load_fonts()
+        load_font(10)
+    except Exception as e:
+        # Ошибка прогрева не должна ломать пул: она повторится и будет видна при отрисовке
+        logger.warning(f"Не удалось подготовить процесс отрисовки: {e}")
+
+
+def _ping():
+    return os.getpid()
+
+
+def render_table(renderer: str, cells, rows: list, columns: list, dpi: int) -> bytes:
+    """Рисует таблицу расписания выбранным способом и возвращает PNG"""
+    buffer = io.BytesIO()
+    if renderer == "pillow":
+        from src.utils.pillow_renderer import render_schedule_image
+        render_schedule_image(cells, rows, columns, buffer, dpi=dpi)
+    elif renderer == "matplotlib":
+        import pandas as pd
+        from src.utils.utils import save_schedule_image
+        save_schedule_image(pd.DataFrame(cells, index=rows, columns=columns), buffer)
+    else:
+        raise ValueError(f"Неизвестный способ отрисовки расписания: {renderer}")
+    return buffer.getvalue()
+
+
+class RenderService:
+    """
+    Отрисовка расписаний в пуле процессов, чтобы не блокировать цикл событий бота.
+    Одинаковые запросы (по ключу изображения) объединяются в одну отрисовку,
+    число ожидающих отрисовок ограничено RENDER_QUEUE_DEPTH.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(RenderService, cls).__new__(cls)
+            cls._instance.workers = RENDER_WORKERS
+            cls._instance.timeout = RENDER_TIMEOUT
+            cls._instance._executor = None
+            cls._instance._slots = None
+            cls._instance._inflight = {}
+        return cls._instance
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.workers > 0:
+                # spawn: процессы не наследуют потоки и соединения бота
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_warm_up
+                )
+            else:
+                # matplotlib не потокобезопасен, поэтому в процессе бота отрисовки идут по одной
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="render")
+        return self._executor
+
+    def start(self):
+        """Запускает все процессы заранее, чтобы первая отрисовка не ждала их инициализации"""
+        if self.workers > 0:
+            executor = self._get_executor()
+            for _ in range(self.workers):
+                executor.submit(_ping)
+            logger.info(f"Запущено процессов отрисовки: {self.workers}")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def render(self, key: str, renderer: str, cells, rows: list, columns: list, dpi: int) -> bytes:
+        """Возвращает PNG; одновременные запросы с одинаковым ключом получают результат одной отрисовки"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._render(renderer, cells, rows, columns, dpi))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: отмена одного из ожидающих не прерывает общую отрисовку
+        return await asyncio.shield(task)
+
+    async def _render(self, renderer, cells, rows, columns, dpi) -> bytes:
+        return await asyncio.wait_for(self._submit(renderer, cells, rows, columns, dpi), self.timeout)
+
+    async def _submit(self, renderer, cells, rows, columns, dpi) -> bytes:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(RENDER_QUEUE_DEPTH)
+
+        loop = asyncio.get_running_loop()
+        async with self._slots:
+            try:
+                return await loop.run_in_executor(
+                    self._get_executor(), render_table, renderer, cells, rows, columns, dpi
+                )
+            except BrokenProcessPool:
+                logger.error("Пул отрисовки остановился, будет создан заново")
+                self._executor = None
+                raise
+
+
+render_service = RenderService()
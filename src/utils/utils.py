@@ -1,14 +1,23 @@
-import matplotlib.pyplot as plt
-import pandas as pd
-import matplotlib.font_manager as fm
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 # Пути к шрифтам
 emoji_font_path = "C:/Windows/Fonts/seguiemj.ttf"  # Шрифт для эмодзи
 cyrillic_font_path = "C:/Windows/Fonts/arial.ttf"  # Шрифт для кириллицы
 
-# Загрузка шрифтов
-emoji_font = fm.FontProperties(fname=emoji_font_path, size=12)
-cyrillic_font = fm.FontProperties(fname=cyrillic_font_path, size=12)
+
+# matplotlib загружается только при первой отрисовке, а не при запуске бота
+@lru_cache(maxsize=None)
+def load_fonts():
+    """Возвращает (шрифт для эмодзи, шрифт для кириллицы)"""
+    import matplotlib.font_manager as fm
+    return fm.FontProperties(fname=emoji_font_path, size=12), fm.FontProperties(fname=cyrillic_font_path, size=12)
+
+# Разрешение итогового изображения
+SCHEDULE_IMAGE_DPI = 300
 
 
 # Функция для определения, содержит ли строка эмодзи
@@ -17,8 +26,16 @@ def contains_emoji(text):
 
 
 # Код для генерации изображения с графиком
-def save_schedule_image(schedule_df: pd.DataFrame, filename="schedule.png"):
-    fig, ax = plt.subplots(figsize=(12, len(schedule_df) * 0.5 + 2))
+def save_schedule_image(schedule_df: "pd.DataFrame", filename="schedule.png"):
+    """
+    Сохраняет изображение расписания в файл; вместо имени файла можно передать буфер (BytesIO).
+    Фигура создаётся без pyplot, поэтому не трогает его глобальное состояние (текущую фигуру).
+    """
+    from matplotlib.figure import Figure
+
+    emoji_font, cyrillic_font = load_fonts()
+    fig = Figure(figsize=(12, len(schedule_df) * 0.5 + 2))
+    ax = fig.subplots()
     ax.axis("off")
 
     table = ax.table(
@@ -50,6 +67,5 @@ def save_schedule_image(schedule_df: pd.DataFrame, filename="schedule.png"):
         elif val == "❌":
             cell.set_facecolor("#ffcdd2")
 
-    plt.tight_layout()
-    plt.savefig(filename, dpi=300)
-    plt.close()
+    fig.tight_layout()
+    fig.savefig(filename, dpi=SCHEDULE_IMAGE_DPI, format="png")
@@ -0,0 +1,81 @@
+"""
+Переход текущего расписания на новую неделю горизонта.
+
+Запуск: python -m unittest discover tests
+"""
+import tempfile
+import unittest
+from datetime import date
+from pathlib import Path
+
+from src.core import backends, exchange_offers
+from src.core.availability import WEEKDAYS, Availability
+from src.core.horizon import load_horizon, publish_upcoming_week, week_schedule
+from src.core.storage import load_schedule, load_schedule_week, save_shifts, update_schedule
+from src.utils.render_cache import render_cache
+
+
+class WeekRolloverTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        data_dir = Path(self._tmp.name)
+        backends._backend = backends.JsonBackend(data_dir)
+        exchange_offers._store = None
+        self._cache_dir = render_cache.cache_dir
+        render_cache.cache_dir = data_dir / "render_cache"
+
+        save_shifts({day: 2 for day in WEEKDAYS})
+        self.responses = [Availability(f"Сотрудник {i}", 0b1111111) for i in range(6)]
+
+    def tearDown(self):
+        backends._backend = None
+        exchange_offers._store = None
+        render_cache.cache_dir = self._cache_dir
+        self._tmp.cleanup()
+
+    def horizon_week(self, week_start: date) -> dict:
+        staff_by_date = {key: entry["staff"] for key, entry in load_horizon()["dates"].items()}
+        return week_schedule(staff_by_date, week_start)
+
+    def test_friday_publishes_the_coming_week(self):
+        _, schedule, _ = publish_upcoming_week(self.responses, today=date(2026, 10, 9))
+
+        self.assertEqual(load_schedule_week(), date(2026, 10, 12))
+        self.assertEqual(schedule, self.horizon_week(date(2026, 10, 12)))
+
+    def test_current_schedule_moves_to_the_new_week(self):
+        publish_upcoming_week(self.responses, today=date(2026, 10, 9))
+        # Через неделю даты 19–25.10 уже есть в горизонте и не пересчитываются,
+        # но текущее расписание всё равно должно перейти на них
+        result, schedule, _ = publish_upcoming_week(self.responses, today=date(2026, 10, 16))
+
+        self.assertNotIn("2026-10-19", result["changed"])
+        self.assertEqual(load_schedule_week(), date(2026, 10, 19))
+        self.assertEqual(load_schedule(), self.horizon_week(date(2026, 10, 19)))
+
+    def test_swap_after_rollover_is_written_to_the_new_week(self):
+        publish_upcoming_week(self.responses, today=date(2026, 10, 9))
+        publish_upcoming_week(self.responses, today=date(2026, 10, 16))
+        previous_week = self.horizon_week(date(2026, 10, 12))
+
+        def swap(schedule):
+            monday, tuesday = schedule["Понедельник"], schedule["Вторник"]
+            giver = next(name for name in monday if name not in tuesday)
+            taker = next(name for name in tuesday if name not in monday)
+            monday[monday.index(giver)] = taker
+            tuesday[tuesday.index(taker)] = giver
+            return True
+
+        update_schedule(swap)
+
+        self.assertEqual(self.horizon_week(date(2026, 10, 19)), load_schedule())
+        self.assertEqual(self.horizon_week(date(2026, 10, 12)), previous_week)
+
+        # Повторный пересчёт той же недели обмен не отменяет
+        _, schedule, _ = publish_upcoming_week(self.responses, today=date(2026, 10, 16))
+        self.assertEqual(schedule, self.horizon_week(date(2026, 10, 19)))
+        self.assertEqual(load_schedule(), schedule)
+
+
+if __name__ == "__main__":
+    unittest.main()